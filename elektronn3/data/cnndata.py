@@ -102,6 +102,15 @@ class PatchCreator(data.Dataset):
             - discrete targets are obtained by nearest-neighbor interpolation
             - non-discrete (continuous) targets are linearly interpolated.
         target_dtype: dtype that target tensors should be cast to.
+        inp_dtype: dtype that input tensors should be cast to after
+            ``transform`` has been applied. If it is an integer type, floating
+            point inputs are rounded and all inputs are clipped to its value
+            range (e.g. [0, 255] for ``np.uint8``) instead of wrapping around.
+            Small integer types like ``np.uint8``
+            can be used to reduce the amount of memory that is transferred
+            per batch if the inputs are normalized after they have been moved
+            to the training device (see the ``input_mean`` and ``input_std``
+            options of :py:class:`elektronn3.training.Trainer`).
         train: Determines if samples come from training or validation
             data.
             If ``True``, training data is returned.
@@ -147,6 +156,7 @@ class PatchCreator(data.Dataset):
             aniso_factor: int = 2,
             target_discrete_ix: Optional[List[int]] = None,
             target_dtype: np.dtype = np.int64,
+            inp_dtype: np.dtype = np.float32,
             train: bool = True,
             warp_prob: Union[bool, float] = False,
             warp_kwargs: Optional[Dict[str, Any]] = None,
@@ -181,15 +191,18 @@ class PatchCreator(data.Dataset):
         self._orig_epoch_size = epoch_size  # Store original epoch_size so it can be reset later.
         self.in_memory = in_memory
 
-        self.patch_shape = np.array(patch_shape, dtype=np.int)
+        self.patch_shape = np.array(patch_shape, dtype=np.int64)
         self.ndim = self.patch_shape.ndim
         self.offset = np.array(offset)
         self.target_patch_shape = self.patch_shape - self.offset * 2
         self._target_dtype = target_dtype
+        self._inp_dtype = np.dtype(inp_dtype)
         self.transform = transform
 
         # Setup internal stuff
         self.pid = os.getpid()
+        self._rng: Optional[np.random.Generator] = None
+        self._rng_pid: Optional[int] = None
 
         # The following fields will be filled when reading data
         self.n_labelled_pixels = 0
@@ -242,6 +255,14 @@ class PatchCreator(data.Dataset):
                 continue
             break
 
+        if inp.dtype != self._inp_dtype:
+            if self._inp_dtype.kind in 'iu':
+                if inp.dtype.kind == 'f':
+                    inp = np.rint(inp)
+                # Saturate instead of wrapping around (e.g. 256 -> 0 for uint8)
+                dtype_info = np.iinfo(self._inp_dtype)
+                inp = np.clip(inp, dtype_info.min, dtype_info.max)
+            inp = inp.astype(self._inp_dtype)
         inp = torch.as_tensor(inp)
         cube_meta = torch.as_tensor(self.cube_meta[i])
         fname = os.path.basename(self.inputs[i].fname)
@@ -273,6 +294,19 @@ class PatchCreator(data.Dataset):
             self.n_successful_warp, self.n_failed_warp,
             float(self.n_successful_warp)/(self.n_failed_warp+self.n_successful_warp))
 
+    @property
+    def rng(self) -> np.random.Generator:
+        """Random number generator of the current process.
+
+        It is created lazily and re-created whenever the process ID changes,
+        so every data loader worker draws from its own random stream (seeded
+        from ``np.random``, which is re-seeded per worker)."""
+        pid = os.getpid()
+        if self._rng is None or self._rng_pid != pid:
+            self._rng = np.random.default_rng(np.random.randint(2**31))
+            self._rng_pid = pid
+        return self._rng
+
     def warp_cut(
             self,
             inp_src: DataSource,
@@ -317,7 +351,7 @@ class PatchCreator(data.Dataset):
         if (warp_prob is True) or (warp_prob == 1):  # always warp
             do_warp = True
         elif 0 < warp_prob < 1:  # warp only a fraction of examples
-            do_warp = True if (np.random.rand() < warp_prob) else False
+            do_warp = True if (self.rng.random() < warp_prob) else False
         else:  # never warp
             do_warp = False
 
@@ -338,7 +372,7 @@ class PatchCreator(data.Dataset):
             aniso_factor=self.aniso_factor,
             target_src_shape=target_src_shape,
             target_patch_shape=target_patch_shape,
-            **warp_kwargs
+            **{'rng': self.rng, **warp_kwargs}
         )
 
         inp, target = coord_transforms.warp_slice(
@@ -357,7 +391,7 @@ class PatchCreator(data.Dataset):
         Draw an example cube according to sampling weight on training data,
         or randomly on valid data
         """
-        i = np.random.choice(
+        i = self.rng.choice(
             np.arange(len(self.cube_prios)),
             p=self.cube_prios / np.sum(self.cube_prios)
         )
@@ -7,6 +7,8 @@
 __all__ = ['warp_slice', 'get_warped_coord_transform', 'WarpingOOBError']
 
 import itertools
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Tuple, Union, Optional, Sequence
 from functools import reduce, lru_cache
 import numpy as np
@@ -21,113 +23,193 @@ from elektronn3.data.sources import DataSource, slice_3d
 #  support for user-defined transforms, similar to the image transforms pipeline).
 #  Code for HDF5 slicing and voxel value interpolation should be in separate modules.
 
-numba.config.THREADING_LAYER = 'tbb'
-
-
-@numba.guvectorize(['void(float32[:,:,:], float32[:], float32[:], float32[:,],)'],
-              '(x,y,z),(i),(i)->()', nopython=True)#target='parallel',
-def map_coordinates_nearest(src, coords, lo, dest):
-    """Generalized ufunc that performs nearest-neighbor interpolation,
-    given a floating point coordinate array expressed by ``coords - lo``.
-
-    We don't pass ``coords - lo`` directly as an argument because we want to
-    compute it inside the gufunc for performance reasons (the simple subtraction
-    ``coords - lo`` in normal numpy code actually takes longer than executing
-    the gufunc for the whole array!)
+# The kernels below are parallelized and also run inside forked DataLoader workers.
+#  Neither TBB nor GNU OpenMP survive forking (processes hang at exit or crash), but
+#  numba's own workqueue layer does. It doesn't support concurrent calls of parallel
+#  kernels from multiple threads of the same process, which never happens here.
+numba.config.THREADING_LAYER = 'workqueue'
+
+# Tile size (in destination lines along z and y) that map_coordinates_linear
+#  splits its work into. The source region read by one tile is small enough
+#  to stay in L2 cache for typical patch shapes and warp strengths.
+_TILE_Z = 8
+_TILE_Y = 16
+
+# Source dtypes that the map_coordinates kernels are compiled for. Data of these
+#  types is read in its native dtype and only cast to float32 inside the
+#  kernels, which keeps sliced uint8/uint16 cubes 4x/2x smaller in memory.
+_KERNEL_SRC_DTYPES = (np.dtype(np.uint8), np.dtype(np.uint16), np.dtype(np.float32))
+_KERNEL_SIGNATURES = [
+    f'void({dt.name}[:,:,:,:], float32[:,:,:,:], float32[:,:,:,:])'
+    for dt in _KERNEL_SRC_DTYPES
+]
+# Nearest-neighbor interpolation only copies values, so it can additionally
+#  write discrete targets in their native dtype.
+_NEAREST_SIGNATURES = _KERNEL_SIGNATURES + [
+    f'void({dt.name}[:,:,:,:], float32[:,:,:,:], {dt.name}[:,:,:,:])'
+    for dt in _KERNEL_SRC_DTYPES if dt != np.float32
+]
+
+_DEFAULT_RNG: Optional[np.random.Generator] = None
+_DEFAULT_RNG_PID: Optional[int] = None
+
+_READ_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_READ_EXECUTOR_PID: Optional[int] = None
+
+
+def _default_rng() -> np.random.Generator:
+    """Get the process-local ``Generator`` that is used for random
+    transformations if no ``rng`` is passed explicitly.
+
+    It is created on first use in each process and seeded from numpy's global
+    RNG, so ``np.random.seed()`` keeps results reproducible and forked
+    ``DataLoader`` workers (whose global RNGs are reseeded by the
+    ``worker_init_fn``) don't share the same random stream."""
+    global _DEFAULT_RNG, _DEFAULT_RNG_PID
+    pid = os.getpid()
+    if _DEFAULT_RNG is None or _DEFAULT_RNG_PID != pid:
+        _DEFAULT_RNG = np.random.default_rng(np.random.randint(2**31))
+        _DEFAULT_RNG_PID = pid
+    return _DEFAULT_RNG
+
+
+def _read_executor() -> ThreadPoolExecutor:
+    """Get the process-local thread that reads target slices in the background.
+
+    Like ``_default_rng()``, it is (re)created on first use in each process,
+    because threads of a parent process don't survive forking into
+    ``DataLoader`` workers."""
+    global _READ_EXECUTOR, _READ_EXECUTOR_PID
+    pid = os.getpid()
+    if _READ_EXECUTOR is None or _READ_EXECUTOR_PID != pid:
+        _READ_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+        _READ_EXECUTOR_PID = pid
+    return _READ_EXECUTOR
+
+
+def _slice_3d_async(src: DataSource, lo: np.ndarray, hi: np.ndarray) -> Future:
+    """Start slicing ``src`` in its native dtype, returning a ``Future``.
+
+    File-backed sources are read on a background thread so that the read
+    can overlap with other work. In-memory arrays are sliced immediately
+    because that is cheaper than handing the work over to another thread."""
+    if isinstance(src, np.ndarray) or getattr(src, 'in_memory', False):
+        future = Future()
+        future.set_result(slice_3d(src, lo, hi, dtype=None))
+        return future
+    return _read_executor().submit(slice_3d, src, lo, hi, dtype=None)
+
+
+@numba.jit(_NEAREST_SIGNATURES, nopython=True, nogil=True, parallel=True,
+           fastmath=True, cache=True, boundscheck=False)
+def map_coordinates_nearest(src, coords, dest):
+    """Parallelized kernel that performs nearest-neighbor interpolation,
+    given a floating point coordinate array ``coords`` that is expressed
+    relative to the origin of ``src``.
+
+    All channels (first axis) of ``src`` are interpolated in one pass: The
+    source coordinate of each destination voxel is only read and rounded
+    once and then reused for every channel. Work is split across threads
+    along the first spatial axis of ``dest``.
 
     **IMPORTANT NOTE**: This function does not do any bounds checking and will
     read from unallocated memory if you pass out-of-bounds coordinates!
-    Always make sure that every coodinate in ``coords - lo`` actually *has* a
+    Always make sure that every coodinate in ``coords`` actually *has* a
     nearest neighbor inside the bounds of ``src``.
     Otherwise, ``dest`` will be filled with garbage values from uninitialized
     memory or will cause a segmentation fault."""
-    u = np.int32(np.round(coords[0] - lo[0]))
-    v = np.int32(np.round(coords[1] - lo[1]))
-    w = np.int32(np.round(coords[2] - lo[2]))
-    dest[0] = src[u,v,w]
-
-
-@numba.jit(nopython=True)
-def _loop_map_coordinates_nearest(src, coords, lo, dest):
-    """Loop-based alternative implementation of map_coordinates_nearest()
-    for easier debugging."""
-    for z in range(coords.shape[0]):
+    for z in numba.prange(coords.shape[0]):
         for y in range(coords.shape[1]):
             for x in range(coords.shape[2]):
-                u = np.int32(np.round(coords[z, y, x, 0] - lo[0]))
-                v = np.int32(np.round(coords[z, y, x, 1] - lo[1]))
-                w = np.int32(np.round(coords[z, y, x, 2] - lo[2]))
-                dest[z, y, x] = src[u,v,w]
-
-
-@numba.guvectorize(['void(float32[:,:,:], float32[:], float32[:], float32[:,],)'],
-              '(x,y,z),(i),(i)->()', nopython=True)# target='parallel'
-def map_coordinates_linear(src, coords, lo, dest):
-    """Generalized ufunc that performs trilinear interpolation,
-    given a floating point coordinate array expressed by ``coords - lo``.
-
-    We don't pass ``coords - lo`` directly as an argument because we want to
-    compute it inside the gufunc for performance reasons (the simple subtraction
-    ``coords - lo`` in normal numpy code actually takes longer than executing
-    the gufunc for the whole array!)
+                u = np.int64(np.round(coords[z, y, x, 0]))
+                v = np.int64(np.round(coords[z, y, x, 1]))
+                w = np.int64(np.round(coords[z, y, x, 2]))
+                for c in range(src.shape[0]):
+                    dest[c, z, y, x] = src[c, u, v, w]
+
+
+@numba.jit(_KERNEL_SIGNATURES, nopython=True, nogil=True, parallel=True,
+           fastmath=True, cache=True, boundscheck=False)
+def map_coordinates_linear(src, coords, dest):
+    """Parallelized kernel that performs trilinear interpolation,
+    given a floating point coordinate array ``coords`` that is expressed
+    relative to the origin of ``src``.
+
+    All channels (first axis) of ``src`` are interpolated in one pass: The
+    8 corner indices and fractional offsets of each destination voxel are
+    only computed once and then reused for every channel. The interpolation
+    itself is written as 7 nested lerps, which compile to fused
+    multiply-adds instead of 8 separately weighted products. Work is split
+    across threads in tiles of ``_TILE_Z x _TILE_Y`` destination lines, so
+    the region of ``src`` that is read by one tile stays in cache even if
+    ``src`` as a whole is much larger than it.
 
     **IMPORTANT NOTE**: This function does not do any bounds checking and will
     read from unallocated memory if you pass out-of-bounds coordinates!
-    Always make sure that every coodinate in ``coords - lo + 1`` is within the
+    Always make sure that every coodinate in ``coords + 1`` is within the
     bounds of ``src``.
     Otherwise, ``dest`` will be filled with garbage values from uninitialized
     memory or will cause a segmentation fault."""
-    u = coords[0] - lo[0]
-    v = coords[1] - lo[1]
-    w = coords[2] - lo[2]
-    u0 = np.int32(u)
-    u1 = u0 + 1
-    du = u - u0
-    v0 = np.int32(v)
-    v1 = v0 + 1
-    dv = v - v0
-    w0 = np.int32(w)
-    w1 = w0 + 1
-    dw = w - w0
-    val = src[u0, v0, w0] * (1-du) * (1-dv) * (1-dw) +\
-          src[u1, v0, w0] * du * (1-dv) * (1-dw) +\
-          src[u0, v1, w0] * (1-du) * dv * (1-dw) +\
-          src[u0, v0, w1] * (1-du) * (1-dv) * dw +\
-          src[u1, v0, w1] * du * (1-dv) * dw +\
-          src[u0, v1, w1] * (1-du) * dv * dw +\
-          src[u1, v1, w0] * du * dv * (1-dw) +\
-          src[u1, v1, w1] * du * dv * dw
-    dest[0] = val
-
-
-@numba.jit(nopython=True)
-def _loop_map_coordinates_linear(src, coords, lo, dest):
-    """Loop-based alternative implementation of map_coordinates_linear()
-    for easier debugging."""
-    for z in range(coords.shape[0]):
-        for y in range(coords.shape[1]):
-            for x in range(coords.shape[2]):
-                u = coords[z, y, x, 0] - lo[0]
-                v = coords[z, y, x, 1] - lo[1]
-                w = coords[z, y, x, 2] - lo[2]
-                u0 = np.int32(u)
-                u1 = u0 + 1
-                du = u - u0
-                v0 = np.int32(v)
-                v1 = v0 + 1
-                dv = v - v0
-                w0 = np.int32(w)
-                w1 = w0 + 1
-                dw = w - w0
-                val = src[u0, v0, w0] * (1-du) * (1-dv) * (1-dw) +\
-                      src[u1, v0, w0] * du * (1-dv) * (1-dw) +\
-                      src[u0, v1, w0] * (1-du) * dv * (1-dw) +\
-                      src[u0, v0, w1] * (1-du) * (1-dv) * dw +\
-                      src[u1, v0, w1] * du * (1-dv) * dw +\
-                      src[u0, v1, w1] * (1-du) * dv * dw +\
-                      src[u1, v1, w0] * du * dv * (1-dw) +\
-                      src[u1, v1, w1] * du * dv * dw
-                dest[z, y, x] = val
+    n_tz = (coords.shape[0] + _TILE_Z - 1) // _TILE_Z
+    n_ty = (coords.shape[1] + _TILE_Y - 1) // _TILE_Y
+    for t in numba.prange(n_tz * n_ty):
+        z_start = (t // n_ty) * _TILE_Z
+        y_start = (t % n_ty) * _TILE_Y
+        for z in range(z_start, min(z_start + _TILE_Z, coords.shape[0])):
+            for y in range(y_start, min(y_start + _TILE_Y, coords.shape[1])):
+                for x in range(coords.shape[2]):
+                    u = coords[z, y, x, 0]
+                    v = coords[z, y, x, 1]
+                    w = coords[z, y, x, 2]
+                    u0 = np.int64(u)
+                    u1 = u0 + 1
+                    du = np.float32(u - u0)
+                    v0 = np.int64(v)
+                    v1 = v0 + 1
+                    dv = np.float32(v - v0)
+                    w0 = np.int64(w)
+                    w1 = w0 + 1
+                    dw = np.float32(w - w0)
+                    for c in range(src.shape[0]):
+                        # Nested linear interpolation along u, v and w. Each
+                        #  step is a single fused multiply-add.
+                        c00 = np.float32(src[c, u0, v0, w0])
+                        c00 += du * (np.float32(src[c, u1, v0, w0]) - c00)
+                        c10 = np.float32(src[c, u0, v1, w0])
+                        c10 += du * (np.float32(src[c, u1, v1, w0]) - c10)
+                        c01 = np.float32(src[c, u0, v0, w1])
+                        c01 += du * (np.float32(src[c, u1, v0, w1]) - c01)
+                        c11 = np.float32(src[c, u0, v1, w1])
+                        c11 += du * (np.float32(src[c, u1, v1, w1]) - c11)
+                        c00 += dv * (c10 - c00)
+                        c01 += dv * (c11 - c01)
+                        dest[c, z, y, x] = c00 + dw * (c01 - c00)
+
+
+def _discrete_target_dtype(
+        target_cut: np.ndarray,
+        target_discrete_ix: Optional[Sequence[int]]
+) -> np.dtype:
+    """Get the dtype of a warped target. Targets whose channels are all
+    discrete are only copied (never interpolated), so they keep their native
+    dtype if the kernels support it. Everything else is returned as floatX."""
+    n_f_t = target_cut.shape[0]
+    all_discrete = target_discrete_ix is None or all(
+        i in target_discrete_ix for i in range(n_f_t)
+    )
+    if all_discrete and target_cut.dtype in _KERNEL_SRC_DTYPES:
+        return target_cut.dtype
+    return np.dtype(floatX)
+
+
+def _kernel_src(cut: np.ndarray) -> np.ndarray:
+    """Prepare a sliced (C, D, H, W) or (D, H, W) source array for the
+    map_coordinates kernels, keeping its dtype if they are compiled for it."""
+    if cut.ndim == 3:
+        cut = cut[None]
+    if cut.dtype not in _KERNEL_SRC_DTYPES:
+        cut = cut.astype(floatX)
+    return cut
 
 
 @lru_cache(maxsize=1)
@@ -194,54 +276,160 @@ def chain_matrices(mat_list):
     return reduce(np.dot, mat_list, identity())
 
 
-def get_random_rotmat(lock_z=False, amount=1.0):
-    gamma = np.random.rand() * 2 * np.pi * amount
-    if lock_z:
-        return rotate_z(gamma)
+@numba.jit(nopython=True, cache=True, fastmath=True)
+def _mul4(A, B, out):
+    """Fully unrolled 4x4 matrix product ``out = A @ B``.
+    ``out`` must not share memory with ``A`` or ``B``."""
+    out[0, 0] = A[0, 0] * B[0, 0] + A[0, 1] * B[1, 0] + A[0, 2] * B[2, 0] + A[0, 3] * B[3, 0]
+    out[0, 1] = A[0, 0] * B[0, 1] + A[0, 1] * B[1, 1] + A[0, 2] * B[2, 1] + A[0, 3] * B[3, 1]
+    out[0, 2] = A[0, 0] * B[0, 2] + A[0, 1] * B[1, 2] + A[0, 2] * B[2, 2] + A[0, 3] * B[3, 2]
+    out[0, 3] = A[0, 0] * B[0, 3] + A[0, 1] * B[1, 3] + A[0, 2] * B[2, 3] + A[0, 3] * B[3, 3]
+    out[1, 0] = A[1, 0] * B[0, 0] + A[1, 1] * B[1, 0] + A[1, 2] * B[2, 0] + A[1, 3] * B[3, 0]
+    out[1, 1] = A[1, 0] * B[0, 1] + A[1, 1] * B[1, 1] + A[1, 2] * B[2, 1] + A[1, 3] * B[3, 1]
+    out[1, 2] = A[1, 0] * B[0, 2] + A[1, 1] * B[1, 2] + A[1, 2] * B[2, 2] + A[1, 3] * B[3, 2]
+    out[1, 3] = A[1, 0] * B[0, 3] + A[1, 1] * B[1, 3] + A[1, 2] * B[2, 3] + A[1, 3] * B[3, 3]
+    out[2, 0] = A[2, 0] * B[0, 0] + A[2, 1] * B[1, 0] + A[2, 2] * B[2, 0] + A[2, 3] * B[3, 0]
+    out[2, 1] = A[2, 0] * B[0, 1] + A[2, 1] * B[1, 1] + A[2, 2] * B[2, 1] + A[2, 3] * B[3, 1]
+    out[2, 2] = A[2, 0] * B[0, 2] + A[2, 1] * B[1, 2] + A[2, 2] * B[2, 2] + A[2, 3] * B[3, 2]
+    out[2, 3] = A[2, 0] * B[0, 3] + A[2, 1] * B[1, 3] + A[2, 2] * B[2, 3] + A[2, 3] * B[3, 3]
+    out[3, 0] = A[3, 0] * B[0, 0] + A[3, 1] * B[1, 0] + A[3, 2] * B[2, 0] + A[3, 3] * B[3, 0]
+    out[3, 1] = A[3, 0] * B[0, 1] + A[3, 1] * B[1, 1] + A[3, 2] * B[2, 1] + A[3, 3] * B[3, 1]
+    out[3, 2] = A[3, 0] * B[0, 2] + A[3, 1] * B[1, 2] + A[3, 2] * B[2, 2] + A[3, 3] * B[3, 2]
+    out[3, 3] = A[3, 0] * B[0, 3] + A[3, 1] * B[1, 3] + A[3, 2] * B[2, 3] + A[3, 3] * B[3, 3]
+
+
+@numba.jit(nopython=True, cache=True)
+def _chain_mul4(mats):
+    """Compiled equivalent of ``chain_matrices()`` for a tuple of 4x4 matrices
+    that share the same dtype and memory layout.
+
+    Avoids the Python and BLAS dispatch overhead of one ``np.dot`` call per
+    matrix, which by far outweighs the actual arithmetic for 4x4 matrices."""
+    out = mats[0].copy()
+    tmp = np.empty_like(out)
+    for i in range(1, len(mats)):
+        _mul4(out, mats[i], tmp)
+        out, tmp = tmp, out
+    return out
+
+
+@numba.jit(nopython=True, cache=True)
+def _inv_affine4(M, out):
+    """Write the inverse of the 4x4 homogeneous transformation matrix ``M``
+    to ``out``. Computations are done in float64 for numerical stability.
+
+    Affine matrices (bottom row ``[0, 0, 0, 1]``) are inverted in closed form:
+    ``[[A, t], [0, 1]]^-1 = [[A^-1, -A^-1 t], [0, 1]]``, with ``A^-1`` obtained
+    from the adjugate of ``A``. This avoids the overhead of a general LAPACK
+    inversion, which is only used for perspective transformations."""
+    M = M.astype(np.float64)
+    if M[3, 0] != 0 or M[3, 1] != 0 or M[3, 2] != 0 or M[3, 3] != 1:
+        out[:] = np.linalg.inv(M)
+        return
+    # Cofactors of the first row of A
+    c00 = M[1, 1] * M[2, 2] - M[1, 2] * M[2, 1]
+    c01 = M[1, 2] * M[2, 0] - M[1, 0] * M[2, 2]
+    c02 = M[1, 0] * M[2, 1] - M[1, 1] * M[2, 0]
+    inv_det = 1.0 / (M[0, 0] * c00 + M[0, 1] * c01 + M[0, 2] * c02)
+    a00 = c00 * inv_det
+    a01 = (M[0, 2] * M[2, 1] - M[0, 1] * M[2, 2]) * inv_det
+    a02 = (M[0, 1] * M[1, 2] - M[0, 2] * M[1, 1]) * inv_det
+    a10 = c01 * inv_det
+    a11 = (M[0, 0] * M[2, 2] - M[0, 2] * M[2, 0]) * inv_det
+    a12 = (M[0, 2] * M[1, 0] - M[0, 0] * M[1, 2]) * inv_det
+    a20 = c02 * inv_det
+    a21 = (M[0, 1] * M[2, 0] - M[0, 0] * M[2, 1]) * inv_det
+    a22 = (M[0, 0] * M[1, 1] - M[0, 1] * M[1, 0]) * inv_det
+    t0, t1, t2 = M[0, 3], M[1, 3], M[2, 3]
+    out[0, 0], out[0, 1], out[0, 2] = a00, a01, a02
+    out[1, 0], out[1, 1], out[1, 2] = a10, a11, a12
+    out[2, 0], out[2, 1], out[2, 2] = a20, a21, a22
+    out[0, 3] = -(a00 * t0 + a01 * t1 + a02 * t2)
+    out[1, 3] = -(a10 * t0 + a11 * t1 + a12 * t2)
+    out[2, 3] = -(a20 * t0 + a21 * t1 + a22 * t2)
+    out[3, 0], out[3, 1], out[3, 2], out[3, 3] = 0.0, 0.0, 0.0, 1.0
 
-    phi = np.random.rand() * 2 * np.pi * amount
-    theta = np.arcsin(np.random.rand()) * amount
 
-    R1 = rotate_z(-phi)
-    R2 = rotate_y(-theta)
-    R3 = rotate_z(gamma)
-    R = chain_matrices([R3, R2, R1])
+@lru_cache()
+def _dest_transform(dest_center, aniso_factor, sample_aniso):
+    """Constant part ``T_dest @ S_dest`` of the warping transformation that
+    only depends on the patch shape and the anisotropy settings."""
+    if sample_aniso:
+        S_dest = scale(1.0 / aniso_factor, 1, 1)
+    else:
+        S_dest = identity()
+    T_dest = translate(*dest_center)
+    return _chain_mul4((T_dest, S_dest))
+
+
+@numba.jit(nopython=True, cache=True)
+def _zyz_rotmat(phi, theta, gamma, out):
+    """Write the rotation part of
+    ``chain_matrices([rotate_z(gamma), rotate_y(-theta), rotate_z(-phi)])``
+    to the upper left 3x3 block of ``out``, using the closed form of the
+    product instead of constructing and multiplying three matrices."""
+    cp, sp = np.cos(phi), np.sin(phi)
+    ct, st = np.cos(theta), np.sin(theta)
+    cg, sg = np.cos(gamma), np.sin(gamma)
+    out[0, 0] = ct
+    out[0, 1] = st * cp
+    out[0, 2] = st * sp
+    out[1, 0] = -cg * st
+    out[1, 1] = cg * ct * cp + sg * sp
+    out[1, 2] = cg * ct * sp - sg * cp
+    out[2, 0] = -sg * st
+    out[2, 1] = sg * ct * cp - cg * sp
+    out[2, 2] = sg * ct * sp + cg * cp
+
+
+def get_random_rotmat(lock_z=False, amount=1.0, rng=None):
+    rng = _default_rng() if rng is None else rng
+    r = rng.random(3)
+    gamma = r[0] * 2 * np.pi * amount
+    if lock_z:
+        phi = 0.0
+        theta = 0.0
+    else:
+        phi = r[1] * 2 * np.pi * amount
+        theta = np.arcsin(r[2]) * amount
+
+    R = identity().copy()
+    _zyz_rotmat(phi, theta, gamma, R)
     return R
 
 
-def get_random_flipmat(no_x_flip=False):
-    F = np.eye(4, dtype=floatX)
-    flips = np.random.binomial(1, 0.5, 4) * 2 - 1
-    flips[3] = 1 # don't flip homogeneous dimension
-    if no_x_flip:
-        flips[2] = 1
+# All 8 combinations of axis flips. Bit k of the table index flips axis k.
+_FLIPMATS = np.stack([
+    np.diag([1 - 2 * ((i >> k) & 1) for k in range(3)] + [1]).astype(floatX)
+    for i in range(8)
+])
+# All 6 permutations of the spatial axes. The first two don't move the z axis.
+_SWAPMATS = np.stack([
+    np.eye(4, dtype=floatX)[list(perm) + [3]]
+    for perm in itertools.permutations(range(3))
+])
 
-    np.fill_diagonal(F, flips)
-    return F
 
+def get_random_flipmat(no_x_flip=False, rng=None):
+    rng = _default_rng() if rng is None else rng
+    # Without x flips, only draw from the first 4 flipmats (bit 2 unset)
+    i = rng.integers(0, 4 if no_x_flip else 8)
+    return _FLIPMATS[i].copy()
 
-def get_random_swapmat(lock_z=False):
-    S = np.eye(4, dtype=floatX)
-    if lock_z:
-        swaps = [[0, 1, 2, 3],
-                 [0, 2, 1, 3]]
-    else:
-        swaps = [[0, 1, 2, 3],
-                 [0, 2, 1, 3],
-                 [1, 0, 2, 3],
-                 [1, 2, 0, 3],
-                 [2, 0, 1, 3],
-                 [2, 1, 0, 3]]
 
-    i = np.random.randint(0, len(swaps))
-    S = S[swaps[i]]
-    return S
+def get_random_swapmat(lock_z=False, rng=None):
+    rng = _default_rng() if rng is None else rng
+    i = rng.integers(0, 2 if lock_z else 6)
+    return _SWAPMATS[i].copy()
 
 
-def get_random_warpmat(lock_z=False, perspective=False, amount=1.0):
-    W = np.eye(4, dtype=floatX)
+def get_random_warpmat(lock_z=False, perspective=False, amount=1.0, rng=None):
+    rng = _default_rng() if rng is None else rng
     amount *= 0.1
-    perturb = np.random.uniform(-amount, amount, (4, 4))
+    # Uniform samples in [-amount, amount), drawn directly in floatX
+    perturb = rng.random((4, 4), dtype=floatX)
+    perturb *= 2 * amount
+    perturb -= amount
     perturb[3,3] = 0
     if lock_z:
         perturb[0] = 0
@@ -252,19 +440,49 @@ def get_random_warpmat(lock_z=False, perspective=False, amount=1.0):
     perturb[3,:3] *= 0.05 # perspective parameters need to be very small
     np.clip(perturb[3,:3], -3e-3, 3e-3, out=perturb[3,:3])
 
-    return W + perturb
+    W = perturb
+    W += identity()
+    return W
 
 
 @lru_cache()
-def make_dest_coords(sh):
+def _axis_ramps(sh):
     """
-    Make coordinate list for destination array of shape sh
+    Make 1D coordinate ramps along the axes of destination array of shape sh
     """
-    zz,xx,yy = np.mgrid[0:sh[0], 0:sh[1], 0:sh[2]]
-    hh = np.ones(sh, dtype=np.int)
-    coords = np.concatenate([zz[...,None], xx[...,None],
-                             yy[...,None], hh[...,None]], axis=-1)
-    return coords.astype(floatX)
+    return tuple(np.arange(n, dtype=floatX) for n in sh)
+
+
+@numba.jit(nopython=True, nogil=True, parallel=True, fastmath=True, cache=True)
+def _affine_grid(M_inv, zz, yy, xx, perspective, out):
+    """Compute the source coordinates ``M_inv @ (z, y, x, 1)`` of each
+    destination voxel directly from the 1D coordinate ramps ``zz``, ``yy``,
+    ``xx`` and write them to the (D, H, W, 3) array ``out``.
+    If ``perspective`` is ``True``, the homogeneous divide by the 4th
+    component is applied on the fly.
+
+    This is equivalent to stacking ``(zz[i], yy[j], xx[k], 1)`` into a dense
+    (D, H, W, 4) array ``coords`` of homogeneous destination coordinates and
+    computing ``np.tensordot(coords, M_inv, axes=[[-1], [1]])``, but that array
+    is never materialized."""
+    for i in numba.prange(zz.shape[0]):
+        for j in range(yy.shape[0]):
+            # Partial sums are constant along the innermost axis
+            a0 = M_inv[0, 0] * zz[i] + M_inv[0, 1] * yy[j] + M_inv[0, 3]
+            a1 = M_inv[1, 0] * zz[i] + M_inv[1, 1] * yy[j] + M_inv[1, 3]
+            a2 = M_inv[2, 0] * zz[i] + M_inv[2, 1] * yy[j] + M_inv[2, 3]
+            if perspective:
+                a3 = M_inv[3, 0] * zz[i] + M_inv[3, 1] * yy[j] + M_inv[3, 3]
+                for k in range(xx.shape[0]):
+                    inv = np.float32(1) / (a3 + M_inv[3, 2] * xx[k])
+                    out[i, j, k, 0] = (a0 + M_inv[0, 2] * xx[k]) * inv
+                    out[i, j, k, 1] = (a1 + M_inv[1, 2] * xx[k]) * inv
+                    out[i, j, k, 2] = (a2 + M_inv[2, 2] * xx[k]) * inv
+            else:
+                for k in range(xx.shape[0]):
+                    out[i, j, k, 0] = a0 + M_inv[0, 2] * xx[k]
+                    out[i, j, k, 1] = a1 + M_inv[1, 2] * xx[k]
+                    out[i, j, k, 2] = a2 + M_inv[2, 2] * xx[k]
 
 
 @lru_cache()
@@ -272,10 +490,13 @@ def make_dest_corners(sh):
     """
     Make coordinate list of the corners of destination array of shape sh
     """
-    corners = list(itertools.product(*([0,1],)*3))
-    sh = np.subtract(sh, 1) # 0-based indices
-    corners = np.multiply(sh, corners)
-    corners = np.hstack((corners, np.ones((8,1)))) # homogeneous coords
+    corners = np.empty((8, 4), dtype=floatX)
+    corners[:, 3] = 1.0  # homogeneous coords
+    for i, (a, b, c) in enumerate(itertools.product((0, 1), repeat=3)):
+        # 0-based indices
+        corners[i, 0] = a * (sh[0] - 1)
+        corners[i, 1] = b * (sh[1] - 1)
+        corners[i, 2] = c * (sh[2] - 1)
     return corners
 
 
@@ -298,6 +519,103 @@ class WarpingSanityError(Exception):
     pass
 
 
+def _target_offsets(
+        inp_src_shape: np.ndarray,
+        target_src_shape: np.ndarray,
+        patch_shape: Tuple[int, ...],
+        target_patch_shape: Tuple[int, ...]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the offsets of the target source w.r.t. the input source and of
+    the target patch w.r.t. the input patch (both are centered)."""
+    target_src_offset = np.subtract(inp_src_shape, target_src_shape)
+    if np.any(np.mod(target_src_offset, 2)):
+        raise ValueError("targets must be centered w.r.t. images")
+    target_src_offset //= 2
+
+    target_offset = np.subtract(patch_shape, target_patch_shape)
+    if np.any(np.mod(target_offset, 2)):
+        raise ValueError("targets must be centered w.r.t. images")
+    target_offset //= 2
+    return target_src_offset, target_offset
+
+
+def _get_axis_permutation(M_inv: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Check if ``M_inv`` maps destination coordinates to source coordinates
+    only by permuting and flipping axes and by translating by whole voxels
+    (which is the case for all non-warped patches).
+
+    Returns the source axis and the flip sign (+1 or -1) of each destination
+    axis if this is the case, otherwise ``None``."""
+    if M_inv[3, 0] != 0 or M_inv[3, 1] != 0 or M_inv[3, 2] != 0:
+        return None
+    A = M_inv[:3, :3]
+    dest_axes = np.arange(3)
+    perm = np.abs(A).argmax(0)
+    signs = np.sign(A[perm, dest_axes])
+    P = np.zeros((3, 3), dtype=A.dtype)
+    P[perm, dest_axes] = signs
+    if np.abs(A - P).max() > 1e-6:
+        return None
+    t = M_inv[:3, 3]
+    if np.abs(t - np.round(t)).max() > 1e-5:
+        return None
+    return perm, signs
+
+
+def _cut_permuted(
+        inp_src: DataSource,
+        lo: np.ndarray,
+        perm: np.ndarray,
+        signs: np.ndarray,
+        patch_shape: Tuple[int, ...],
+        target_src: Optional[DataSource] = None,
+        target_patch_shape: Optional[Tuple[int, ...]] = None,
+        target_discrete_ix: Optional[Sequence[int]] = None,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Fast path of ``warp_slice()`` for transformations that only permute
+    and flip axes and translate by whole voxels (see ``_get_axis_permutation()``).
+
+    Source coordinates fall exactly onto the voxel grid in this case, so
+    patches are directly sliced and rearranged instead of being interpolated."""
+    # Reorder (C, D, H, W) source axes to destination axes, then apply flips.
+    axes = (0,) + tuple(1 + perm)
+    flips = (slice(None),) + tuple(slice(None, None, int(s)) for s in signs)
+    # Extent of the patch along each source axis
+    inv_perm = np.argsort(perm)
+
+    inp_src_shape = np.array(inp_src.shape[-3:])
+    hi = lo + np.array(patch_shape)[inv_perm]
+    if np.any(lo < 0) or np.any(hi > inp_src_shape):
+        raise WarpingOOBError("Out of bounds for inp_src")
+    # Slice in the native dtype so the cast to floatX happens in the same pass
+    #  as the copy of the rearranged view.
+    img_cut = slice_3d(inp_src, lo, hi, dtype=None)
+    if img_cut.ndim == 3:
+        img_cut = img_cut[None]
+    inp = np.ascontiguousarray(img_cut.transpose(axes)[flips], dtype=floatX)
+
+    if target_src is None:
+        return inp, None
+
+    target_src_shape = np.array(target_src.shape[-3:])
+    target_src_offset, target_offset = _target_offsets(
+        inp_src_shape, target_src_shape, patch_shape, target_patch_shape
+    )
+    # Target patches are centered in the input patches, so regardless of
+    #  flips, they start at lo + target_offset (w.r.t. the input source).
+    lo_targ = lo + target_offset[inv_perm] - target_src_offset
+    hi_targ = lo_targ + np.array(target_patch_shape)[inv_perm]
+    if np.any(lo_targ < 0) or np.any(hi_targ > target_src_shape):
+        raise WarpingOOBError("Out of bounds for target_src")
+    target_cut = slice_3d(target_src, lo_targ, hi_targ, dtype=None)
+    if target_cut.ndim == 3:
+        target_cut = target_cut[None]
+    target_dtype = _discrete_target_dtype(target_cut, target_discrete_ix)
+    target = np.ascontiguousarray(target_cut.transpose(axes)[flips], dtype=target_dtype)
+
+    return inp, target
+
+
 def warp_slice(
         inp_src: DataSource,
         patch_shape: Union[Tuple[int, ...], np.ndarray],
@@ -355,6 +673,9 @@ def warp_slice(
     target
         Warped target_src image slice
         or ``None``, if ``target_src is None``.
+        If all target channels are discrete and ``target_src`` is of dtype
+        uint8, uint16 or float32, ``target`` has the same dtype as
+        ``target_src``. Otherwise, it is converted to ``floatX``.
     """
 
     patch_shape = tuple(patch_shape)
@@ -368,23 +689,40 @@ def warp_slice(
     # Spatial shapes of input and target data sources
     inp_src_shape = np.array(inp_src.shape[-3:])
 
-    M_inv = np.linalg.inv(M.astype(np.float64)).astype(floatX) # stability...
+    # Non-zero perspective parameters require a homogeneous divide.
+    has_perspective = bool(M[3, 0] or M[3, 1] or M[3, 2])
+    M_inv = np.empty((4, 4), dtype=floatX)
+    _inv_affine4(M, M_inv)
     dest_corners = make_dest_corners(patch_shape)
     src_corners = np.dot(M_inv, dest_corners.T).T
-    if np.any(M[3,:3] != 0): # homogeneous divide
+    if has_perspective:  # homogeneous divide
         src_corners /= src_corners[:,3][:,None]
 
     # check corners
     src_corners = src_corners[:,:3]
-    lo = np.min(np.floor(src_corners), 0).astype(np.int)
-    hi = np.max(np.ceil(src_corners + 1), 0).astype(np.int)
+
+    axis_permutation = _get_axis_permutation(M_inv)
+    if axis_permutation is not None:
+        # No interpolation required, just slice and rearrange voxels
+        lo = np.round(np.min(src_corners, 0)).astype(np.int32)
+        return _cut_permuted(
+            inp_src, lo, *axis_permutation, patch_shape, target_src,
+            None if target_src is None else tuple(target_patch_shape),
+            target_discrete_ix
+        )
+
+    lo = np.min(np.floor(src_corners), 0).astype(np.int32)
+    hi = np.max(np.ceil(src_corners + 1), 0).astype(np.int32)
     # compute/transform dense coords
-    dest_coords = make_dest_coords(patch_shape)
-    src_coords = np.tensordot(dest_coords, M_inv, axes=[[-1], [1]])
-    if np.any(M[3, :3] != 0):  # homogeneous divide
-        src_coords /= src_coords[..., 3][..., None]
-    # cut patch
-    src_coords = src_coords[..., :3]
+    # Coords are computed relative to lo (the origin of the input cut) by
+    #  folding the offset into M_inv, so the kernels don't need to subtract it.
+    #  Scaling lo by the last row of M_inv keeps this correct for perspective
+    #  transforms, where the offset is applied after the homogeneous divide.
+    M_inv_cut = M_inv.astype(np.float64)
+    M_inv_cut[:3] -= lo[:, None] * M_inv_cut[3]
+    M_inv_cut = M_inv_cut.astype(floatX)
+    src_coords = np.empty(patch_shape + (3,), dtype=floatX)
+    _affine_grid(M_inv_cut, *_axis_ramps(patch_shape), has_perspective, src_coords)
 
     # TODO: WIP code, integrate this into the warping pipeline with config options
     # Perform elastic deformation on warped coordinates so we don't have
@@ -409,22 +747,16 @@ def warp_slice(
             src_coords[..., i] += elastic_displacement
             # Clip out-of-bounds coordinates back to original cube edges to
             #  prevent out-of-bounds reading
-            np.clip(src_coords[..., i], lo[i], hi[i] - 1, out=src_coords[..., i])
+            np.clip(src_coords[..., i], 0, hi[i] - lo[i] - 1, out=src_coords[..., i])
 
     if target_src is not None:
         target_src_shape = np.array(target_src.shape[-3:])
         target_patch_shape = tuple(target_patch_shape)
         n_f_t = target_src.shape[0] if target_src.ndim == 4 else 1
 
-        target_src_offset = np.subtract(inp_src_shape, target_src.shape[-3:])
-        if np.any(np.mod(target_src_offset, 2)):
-            raise ValueError("targets must be centered w.r.t. images")
-        target_src_offset //= 2
-
-        target_offset = np.subtract(patch_shape, target_patch_shape)
-        if np.any(np.mod(target_offset, 2)):
-            raise ValueError("targets must be centered w.r.t. images")
-        target_offset //= 2
+        target_src_offset, target_offset = _target_offsets(
+            inp_src_shape, target_src_shape, patch_shape, target_patch_shape
+        )
 
         src_coords_target = src_coords[
             target_offset[0]:(target_offset[0] + target_patch_shape[0]),
@@ -432,72 +764,89 @@ def warp_slice(
             target_offset[2]:(target_offset[2] + target_patch_shape[2])
         ]
         # shift coords to be w.r.t. to origin of target_src array
-        lo_targ = np.floor(src_coords_target.min(2).min(1).min(0) - target_src_offset).astype(np.int)
-        hi_targ = np.ceil(src_coords_target.max(2).max(1).max(0) + 1 - target_src_offset).astype(np.int)
+        lo_targ = np.floor(src_coords_target.min(2).min(1).min(0) + lo - target_src_offset).astype(np.int32)
+        hi_targ = np.ceil(src_coords_target.max(2).max(1).max(0) + lo + 1 - target_src_offset).astype(np.int32)
         if np.any(lo_targ < 0) or np.any(hi_targ >= target_src_shape - 1):
             raise WarpingOOBError("Out of bounds for target_src")
 
     if np.any(lo < 0) or np.any(hi >= inp_src_shape - 1):
         raise WarpingOOBError("Out of bounds for inp_src")
 
+    if target_src is not None:
+        # Read the target while the input is being sliced and interpolated.
+        # Slice to hi + 1 because interpolation potentially needs this value.
+        target_read = _slice_3d_async(target_src, lo_targ, hi_targ + 1)
+
     # Slice and interpolate input
     # Slice to hi + 1 because interpolation potentially needs this value.
-    img_cut = slice_3d(inp_src, lo, hi + 1, dtype=floatX)
-    if img_cut.ndim == 3:
-        img_cut = img_cut[None]
+    img_cut = _kernel_src(slice_3d(inp_src, lo, hi + 1, dtype=None))
     inp = np.zeros((n_f,) + patch_shape, dtype=floatX)
-    lo = lo.astype(floatX)
 
-    if debug and np.any((src_coords - lo).max(2).max(1).max(0) >= img_cut.shape[-3:]):
-        raise WarpingSanityError(f'src_coords check failed (too high).\n{(src_coords - lo).max(2).max(1).max(0), img_cut.shape[-3:]}')
-    if debug and np.any((src_coords - lo).min(2).min(1).min(0) < 0):
-        raise WarpingSanityError(f'src_coords check failed (negative indices).\n{(src_coords - lo).min(2).min(1).min(0)}')
+    if debug and np.any(src_coords.max(2).max(1).max(0) >= img_cut.shape[-3:]):
+        raise WarpingSanityError(f'src_coords check failed (too high).\n{src_coords.max(2).max(1).max(0), img_cut.shape[-3:]}')
+    if debug and np.any(src_coords.min(2).min(1).min(0) < 0):
+        raise WarpingSanityError(f'src_coords check failed (negative indices).\n{src_coords.min(2).min(1).min(0)}')
 
-    for k in range(n_f):
-        map_coordinates_linear(img_cut[k], src_coords, lo, inp[k])
+    map_coordinates_linear(img_cut, src_coords, inp)
 
     # Slice and interpolate target
     if target_src is not None:
-        # dtype is float as well here because of the static typing of the
-        # numba-compiled map_coordinates functions
-        # Slice to hi + 1 because interpolation potentially needs this value.
-        target_cut = slice_3d(target_src, lo_targ, hi_targ + 1, dtype=floatX)
-        if target_cut.ndim == 3:
-            target_cut = target_cut[None]
-        src_coords_target = np.ascontiguousarray(src_coords_target, dtype=floatX)
-        target = np.zeros((n_f_t,) + target_patch_shape, dtype=floatX)
-        lo_targ = (lo_targ + target_src_offset).astype(floatX)
+        target_cut = _kernel_src(target_read.result())
+        # Target coords are a view into src_coords, i.e. relative to the input
+        #  cut. Shifting them to the origin of the target cut also makes them
+        #  contiguous. Without a shift, the view is only non-contiguous if the
+        #  target patch is smaller than the input patch.
+        target_shift = lo_targ + target_src_offset - lo
+        if np.any(target_shift != 0):
+            src_coords_target = src_coords_target - target_shift.astype(floatX)
+        elif not src_coords_target.flags['C_CONTIGUOUS']:
+            src_coords_target = np.ascontiguousarray(src_coords_target)
+        target_dtype = _discrete_target_dtype(target_cut, target_discrete_ix)
+        target = np.zeros((n_f_t,) + target_patch_shape, dtype=target_dtype)
         if target_discrete_ix is None:
             target_discrete_ix = [True for i in range(n_f_t)]
         else:
             target_discrete_ix = [i in target_discrete_ix for i in range(n_f_t)]
 
-        if debug and np.any((src_coords_target - lo_targ).max(2).max(1).max(0) >= target_cut.shape[-3:]):
-            raise WarpingSanityError(f'src_coords_target check failed (too high).\n{(src_coords_target - lo_targ).max(2).max(1).max(0)}\n{target_cut.shape[-3:]}')
-        if debug and np.any((src_coords_target - lo_targ).min(2).min(1).min(0) < 0):
-            raise WarpingSanityError(f'src_coords_target check failed (negative indices).\n{(src_coords_target - lo_targ).min(2).min(1).min(0)}')
-
-        for k, discr in enumerate(target_discrete_ix):
-            if discr:
-                map_coordinates_nearest(target_cut[k], src_coords_target, lo_targ, target[k])
-
-                if debug:
-                    unique_cut = set(list(np.unique(target_cut[k])))
-                    unique_warp = set(list(np.unique(target[k])))
-                    # If new values appear in discrete targets, there is something wrong.
-                    # unique_warp can have less values than unique_cut though, for example
-                    #  if the warping transform coincidentally slices away all values of a class.
-                    if not unique_warp.issubset(unique_cut):
-                        print(
-                            f'Invalid target encountered:\n\nunique_cut=\n{unique_cut}\n'
-                            f'unique_warp=\n{unique_warp}\nM_inv=\n{M_inv}\n'
-                            f'src_coords_target - lo_targ=\n{src_coords_target - lo_targ}\n'
-                        )
-                        # Try dropping to an IPython shell (Won't work with num_workers > 0).
-                        import IPython; IPython.embed(); raise SystemExit
+        if debug and np.any(src_coords_target.max(2).max(1).max(0) >= target_cut.shape[-3:]):
+            raise WarpingSanityError(f'src_coords_target check failed (too high).\n{src_coords_target.max(2).max(1).max(0)}\n{target_cut.shape[-3:]}')
+        if debug and np.any(src_coords_target.min(2).min(1).min(0) < 0):
+            raise WarpingSanityError(f'src_coords_target check failed (negative indices).\n{src_coords_target.min(2).min(1).min(0)}')
 
-            else:
-                map_coordinates_linear(target_cut[k], src_coords_target, lo_targ, target[k])
+        if all(target_discrete_ix):
+            map_coordinates_nearest(target_cut, src_coords_target, target)
+        elif not any(target_discrete_ix):
+            map_coordinates_linear(target_cut, src_coords_target, target)
+        else:
+            # Mixed discrete and continuous channels: Interpolate all channels of
+            #  each kind in one kernel call so coordinates are only traversed twice.
+            discrete_ix = np.flatnonzero(target_discrete_ix)
+            continuous_ix = np.flatnonzero(np.logical_not(target_discrete_ix))
+            for ix, kernel in [
+                    (discrete_ix, map_coordinates_nearest),
+                    (continuous_ix, map_coordinates_linear)
+            ]:
+                target_ix = np.empty((len(ix),) + target_patch_shape, dtype=floatX)
+                kernel(target_cut[ix], src_coords_target, target_ix)
+                target[ix] = target_ix
+
+        if debug:
+            for k, discr in enumerate(target_discrete_ix):
+                if not discr:
+                    continue
+                unique_cut = set(list(np.unique(target_cut[k])))
+                unique_warp = set(list(np.unique(target[k])))
+                # If new values appear in discrete targets, there is something wrong.
+                # unique_warp can have less values than unique_cut though, for example
+                #  if the warping transform coincidentally slices away all values of a class.
+                if not unique_warp.issubset(unique_cut):
+                    print(
+                        f'Invalid target encountered:\n\nunique_cut=\n{unique_cut}\n'
+                        f'unique_warp=\n{unique_warp}\nM_inv=\n{M_inv}\n'
+                        f'src_coords_target=\n{src_coords_target}\n'
+                    )
+                    # Try dropping to an IPython shell (Won't work with num_workers > 0).
+                    import IPython; IPython.embed(); raise SystemExit
 
     else:
         target = None
@@ -521,6 +870,7 @@ def get_warped_coord_transform(
         perspective: bool = False,
         target_src_shape: Optional[Union[Tuple, np.ndarray]] = None,
         target_patch_shape: Optional[Union[Tuple, np.ndarray]] = None,
+        rng: Optional[np.random.Generator] = None,
 ) -> np.ndarray:
     """
     Generates the warping transformation parameters and composes them into a
@@ -554,6 +904,10 @@ def get_warped_coord_transform(
         Target data source shape
     target_patch_shape
         Target patch shape
+    rng
+        Random number generator that is used for sampling the patch location
+        and the random transformations. If ``None`` (default), a
+        process-local generator that is seeded from numpy's global RNG is used.
 
     Returns
     -------
@@ -588,7 +942,7 @@ def get_warped_coord_transform(
     else:
         lo_pos = dest_center
         hi_pos = spatial_inp_src_shape - dest_center
-    if not np.all([lo_pos[i] < hi_pos[i] for i in range(3)]):
+    if not (lo_pos[0] < hi_pos[0] and lo_pos[1] < hi_pos[1] and lo_pos[2] < hi_pos[2]):
         raise RuntimeError(
             f'lo_pos: {lo_pos}, hi_pos: {hi_pos}\n'
             'lo_pos has to be smaller than hi_pos in all dimensions, but this '
@@ -596,23 +950,24 @@ def get_warped_coord_transform(
             'is significantly smaller than the shape of the smallest labelled '
             'region of your data set.'
         )
-    z = np.random.randint(lo_pos[0], hi_pos[0]) + src_remainder[0]
-    y = np.random.randint(lo_pos[1], hi_pos[1]) + src_remainder[1]
-    x = np.random.randint(lo_pos[2], hi_pos[2]) + src_remainder[2]
+    rng = _default_rng() if rng is None else rng
+    z = rng.integers(lo_pos[0], hi_pos[0]) + src_remainder[0]
+    y = rng.integers(lo_pos[1], hi_pos[1]) + src_remainder[1]
+    x = rng.integers(lo_pos[2], hi_pos[2]) + src_remainder[2]
 
     # Generate coordinate transformation matrices that express the region
-    F = get_random_flipmat(no_x_flip)
+    F = get_random_flipmat(no_x_flip, rng=rng)
     if no_x_flip:
         S = np.eye(4, dtype=floatX)
     else:
-        S = get_random_swapmat(lock_z)
+        S = get_random_swapmat(lock_z, rng=rng)
 
     if np.isclose(warp_amount, 0):
         R = np.eye(4, dtype=floatX)
         W = np.eye(4, dtype=floatX)
     else:
-        R = get_random_rotmat(lock_z, warp_amount)
-        W = get_random_warpmat(lock_z, perspective, warp_amount)
+        R = get_random_rotmat(lock_z, warp_amount, rng=rng)
+        W = get_random_warpmat(lock_z, perspective, warp_amount, rng=rng)
 
     # Using negative translations and inverse anisotropic scaling because of
     #  later matrix inversion? (see M_inv in warp_slice())
@@ -620,16 +975,14 @@ def get_warped_coord_transform(
     T_src = translate(-z, -y, -x)
     S_src = scale(aniso_factor, 1, 1)
 
-    if sample_aniso:
-        S_dest = scale(1.0 / aniso_factor, 1, 1)
-    else:
-        S_dest = identity()
-    T_dest = translate(dest_center[0], dest_center[1], dest_center[2])
+    # T_dest @ S_dest only depends on the patch shape and the anisotropy settings,
+    #  so it is cached.
+    TS_dest = _dest_transform(tuple(dest_center), aniso_factor, sample_aniso)
 
     # Reduce all transformations into a single matrix M by applying consecutive
     #  matrix multiplications. Applying M to a homogeneous coordinate vector
     #  is mathematically equivalent to consecutively applying each matrix to it.
     #  See https://en.wikipedia.org/wiki/Transformation_matrix#Composing_and_inverting_transformations
-    M = chain_matrices([T_dest, S_dest, R, W, F, S, S_src, T_src])
+    M = _chain_mul4((TS_dest, R, W, F, S, S_src, T_src))
 
     return M
@@ -7,7 +7,7 @@
 # Authors: Martin Drawitsch
 
 import os
-from typing import Union, Any, Sequence
+from typing import Union, Any, Optional, Sequence
 
 import h5py
 import numpy as np
@@ -66,7 +66,7 @@ def slice_3d(
         src: DataSource,
         coords_lo: Sequence[int],
         coords_hi: Sequence[int],
-        dtype: type = np.float32,
+        dtype: Optional[type] = np.float32,
         prepend_empty_axis: bool = False,
         check_bounds=True,
 ) -> np.ndarray:
@@ -80,7 +80,8 @@ def slice_3d(
         coords_hi: Upper bound of the coordinates where data should be read
             from in ``src``.
         dtype: NumPy ``dtype`` that the sliced array will be cast to if it
-            doesn't already have this dtype.
+            doesn't already have this dtype. If ``None``, the native dtype
+            of ``src`` is kept.
         prepend_empty_axis: Prepends a new empty (1-sized) axis to the sliced
             array before returning it.
         check_bounds: If ``True`` (default), only indices that are within the
@@ -121,5 +122,6 @@ def slice_3d(
         raise ValueError(f'Expected src.ndim to be 3 or 4, but got {src.ndim} instead.')
     if prepend_empty_axis:
         cut = cut[None]
-    cut = cut.astype(dtype, copy=False)
+    if dtype is not None:
+        cut = cut.astype(dtype, copy=False)
     return cut
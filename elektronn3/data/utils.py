@@ -8,7 +8,7 @@
 import logging
 import os
 import signal
-from typing import Sequence, Tuple
+from typing import Optional, Sequence, Tuple
 
 import h5py
 import numpy as np
@@ -191,6 +191,68 @@ def save_to_h5(data, path, hdf5_names=None, overwrite=False, compression=True):
     f.close()
 
 
+def rechunk_h5(
+        src_path: str,
+        dest_path: str,
+        keys: Optional[Sequence[str]] = None,
+        chunks: Sequence[int] = (32, 64, 64),
+        compression: Optional[str] = 'lzf',
+) -> None:
+    """Copy 3D datasets of an HDF5 file to a new file whose chunk layout
+    matches patch-wise random access.
+
+    HDF5 always reads and decompresses whole chunks, so files that are stored
+    contiguously or with chunks that span whole slices make every patch read
+    (e.g. in :py:class:`elektronn3.data.cnndata.PatchCreator`) much more
+    expensive than necessary. Chunks should be a fraction of the patch shape
+    and stay below 1 MiB, which is the size of h5py's default chunk cache.
+
+    Args:
+        src_path: Path to the original HDF5 file.
+        dest_path: Path where the re-chunked HDF5 file should be written.
+            It is removed again if copying fails.
+        keys: Names of the datasets that should be copied. By default, all
+            top-level datasets are copied. Datasets with less than 3
+            dimensions (e.g. offsets or resolutions) and groups are copied
+            unchanged.
+        chunks: Spatial (D, H, W) chunk shape. Datasets with a channel axis
+            (C, D, H, W) store all channels of a location in one chunk.
+        compression: h5py compression filter. The default ``'lzf'`` is much
+            faster to decompress than ``'gzip'``.
+    """
+    src_path = os.path.expanduser(src_path)
+    dest_path = os.path.expanduser(dest_path)
+    with h5py.File(src_path, 'r') as src:
+        try:
+            with h5py.File(dest_path, 'w') as dest:
+                dest.attrs.update(src.attrs)
+                if keys is None:
+                    keys = [k for k in src.keys() if isinstance(src[k], h5py.Dataset)]
+                for key in keys:
+                    src_data = src[key]
+                    if not isinstance(src_data, h5py.Dataset) or src_data.ndim < 3:
+                        src.copy(src_data, dest, name=key)
+                        continue
+                    spatial_shape = src_data.shape[-3:]
+                    ds_chunks = tuple(min(c, s) for c, s in zip(chunks, spatial_shape))
+                    ds_chunks = src_data.shape[:-3] + ds_chunks
+                    dest_data = dest.create_dataset(
+                        key, shape=src_data.shape, dtype=src_data.dtype,
+                        chunks=ds_chunks, compression=compression
+                    )
+                    dest_data.attrs.update(src_data.attrs)
+                    # Copy in slabs of one chunk row along D to limit memory usage
+                    slab = ds_chunks[-3]
+                    for z in range(0, spatial_shape[0], slab):
+                        dest_data[..., z:z + slab, :, :] = src_data[..., z:z + slab, :, :]
+                    logger.info(f'Re-chunked {src_path}[{key}] with chunks {ds_chunks} to {dest_path}.')
+        except BaseException:
+            # Don't leave a half-written file behind
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            raise
+
+
 def as_floatX(x):
     if not hasattr(x, '__len__'):
         return np.array(x, dtype=floatX)
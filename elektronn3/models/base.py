@@ -3,6 +3,7 @@
 # Copyright (c) 2017 - now
 # Max Planck Institute of Neurobiology, Munich, Germany
 
+import logging
 import torch
 import torch.nn as nn
 import glob
@@ -12,6 +13,8 @@ import time
 from typing import Union
 from elektronn3.training.train_utils import pretty_string_time
 
+logger = logging.getLogger('elektronn3log')
+
 
 class InferenceModel(object):
     """Class to perform inference using a trained elektronn3 model or nn.Module object.
@@ -19,7 +22,11 @@ class InferenceModel(object):
     Args:
         src: Path to training folder of e3 model or already loaded/initialized nn.Module defining the model.
         disable_cuda: use cpu only
-        multi_gpu: enable multi-gpu support of pytorch
+        multi_gpu: Deprecated and ignored. ``nn.DataParallel`` is not used
+            anymore because it replicates the model in every forward pass.
+            To use multiple GPUs, run one process per GPU instead (for
+            training, see the ``torchrun`` instructions in
+            ``examples/train_unet_neurodata.py``).
     Examples:
         >>> cnn = nn.Sequential(
         ... nn.Conv2d(5, 32, 3, padding=1), nn.ReLU(),
@@ -30,7 +37,7 @@ class InferenceModel(object):
         >>> assert np.all(np.array(out.shape) == np.array([2, 2, 10, 10]))
     """
     def __init__(self, src: Union[str, nn.Module], disable_cuda: bool = False,
-                 multi_gpu: bool = True, normalize_func=None):
+                 multi_gpu: bool = False, normalize_func=None):
         self.normalize_func = normalize_func
         if not disable_cuda and torch.cuda.is_available():
             device = torch.device('cuda')
@@ -46,7 +53,7 @@ class InferenceModel(object):
             self.model_p = None
         self.model.eval()
         if multi_gpu:
-            self.model = nn.DataParallel(self.model)
+            logger.warning('InferenceModel(multi_gpu=True) is deprecated and ignored. Running on a single device.')
         self.model.to(self.device)
 
     def predict_proba(self, inp: np.ndarray, bs: int = 10,
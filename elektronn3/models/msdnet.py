@@ -39,7 +39,7 @@ class MSDNet(nn.Module):
     @staticmethod
     def weight_init(m):
         if isinstance(m, nn.Linear):
-            nn.init.kaiming_normal(m, m.weight.data)
+            nn.init.kaiming_normal_(m.weight)
 
     def __init__(self, in_channels=1, out_channels=2, num_layers=40, volumetric=True):
 
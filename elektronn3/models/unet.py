@@ -501,12 +501,12 @@ class GridAttention(nn.Module):
         def weight_init(m):
             classname = m.__class__.__name__
             if classname.find('Conv') != -1:
-                nn.init.kaiming_normal_(m.weight.data, a=0, mode='fan_in')
+                nn.init.kaiming_normal_(m.weight, a=0, mode='fan_in')
             elif classname.find('Linear') != -1:
-                nn.init.kaiming_normal_(m.weight.data, a=0, mode='fan_in')
+                nn.init.kaiming_normal_(m.weight, a=0, mode='fan_in')
             elif classname.find('BatchNorm') != -1:
-                nn.init.normal_(m.weight.data, 1.0, 0.02)
-                nn.init.constant_(m.bias.data, 0.0)
+                nn.init.normal_(m.weight, 1.0, 0.02)
+                nn.init.zeros_(m.bias)
         self.apply(weight_init)
 
 
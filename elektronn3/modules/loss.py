@@ -39,9 +39,11 @@ class CombinedLoss(torch.nn.Module):
         self.register_buffer('weight', weight.to(self.device))
 
     def forward(self, *args):
-        loss = torch.tensor(0., device=self.device)
+        # Start from a Python scalar instead of allocating a new tensor on self.device
+        #  in each call, which would require a synchronizing host-to-device copy.
+        loss = 0.
         for crit, weight in zip(self.criteria, self.weight):
-            loss += weight * crit(*args)
+            loss = loss + weight * crit(*args)
         return loss
 
 
@@ -6,6 +6,7 @@
 import datetime
 import inspect
 import logging
+import time
 from math import nan
 from pathlib import Path
 from typing import Dict, List, Tuple, Union
@@ -42,6 +43,7 @@ class TrainerMulti(Trainer):
         visualizations are computed and logged to tensorboard."""
         self.start_time = datetime.datetime.now()
         self.end_time = self.start_time + datetime.timedelta(seconds=max_runtime)
+        self._deadline = time.monotonic() + max_runtime
         self._save_model(suffix='_initial', verbose=False)
         self._lr_nhood.clear()
         self._lr_nhood.append(self.optimizer.param_groups[0]['lr'])  # LR of the first training step
@@ -125,7 +127,7 @@ class TrainerMulti(Trainer):
         images: Dict[str, np.ndarray] = {}
 
         self.model.train()
-        self.optimizer.zero_grad()
+        self.optimizer.zero_grad(set_to_none=True)
         running_vx_size = 0  # Counts input sizes (number of pixels/voxels) of training batches
         timer = Timer()
         import gc
@@ -138,8 +140,8 @@ class TrainerMulti(Trainer):
             inp, target = batch['inp'], batch['target']
             cube_meta = batch['cube_meta']
             fname = batch['fname']
-            dinp = inp.to(self.device, non_blocking=True)
-            dtarget = target[:,:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop].to(self.device, non_blocking=True) if self.loss_crop else target.to(self.device, non_blocking=True)
+            dinp = self._normalize_input(inp.to(self.device, non_blocking=True))
+            dtarget = self._target_to_device(target[:,:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop] if self.loss_crop else target)
             weight = cube_meta[0].to(device=self.device, dtype=self.criterion.weight.dtype, non_blocking=True)
             prev_weight = self.criterion.weight.clone()
             self.criterion.weight = weight
@@ -152,10 +154,11 @@ class TrainerMulti(Trainer):
                 self.criterion.weight = ignore_mask * dense_weight + needs_positive_target_mark * positive_target_mask * prev_weight.view(1,-1,1,1,1)
 
             # forward pass
-            dout = self.model(dinp)[:,:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop] if self.loss_crop else self.model(dinp)
+            with self._autocast():
+                dout = self.model(dinp)[:,:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop] if self.loss_crop else self.model(dinp)
 
-            #print(dout.dtype, dout.shape, dtarget.dtype, dtarget.shape, dout.min(), dout.max())
-            dloss = self.criterion(dout, dtarget)
+                #print(dout.dtype, dout.shape, dtarget.dtype, dtarget.shape, dout.min(), dout.max())
+                dloss = self.criterion(dout, dtarget)
             #dcumloss = dloss if i == 0 else dcumloss + dloss
             #print(dloss, dloss.size())
             #dloss = (dloss * prev_weight * weight).mean()
@@ -163,18 +166,14 @@ class TrainerMulti(Trainer):
                 logger.error('NaN loss detected! Aborting training.')
                 raise NaNException
 
-            if self.mixed_precision:
-                from apex import amp
-                with amp.scale_loss(dloss, self.optimizer) as scaled_loss:
-                    scaled_loss.backward()
-            else:
-                # update step
-                dloss.backward()
+            # update step
+            self.grad_scaler.scale(dloss).backward()
 
             if i % self.optimizer_iterations == self.optimizer_iterations - 1:
-                self.optimizer.step()
+                self.grad_scaler.step(self.optimizer)
+                self.grad_scaler.update()
                 # TODO (lp): calling zero_grad() here makes gradients disappear from tb histograms
-                self.optimizer.zero_grad()
+                self.optimizer.zero_grad(set_to_none=True)
                 #loss2 = float(self.criterion(self.model(dinp), dtarget))
                 #print(f'loss gain factor {np.divide(float(dloss), (float(dloss)-loss2))})')
             # End of core training loop on self.device
@@ -248,7 +247,7 @@ class TrainerMulti(Trainer):
             if self.step >= max_steps:
                 logger.info(f'max_steps ({max_steps}) exceeded. Terminating...')
                 self.terminate = True
-            if datetime.datetime.now() >= self.end_time:
+            if time.monotonic() >= self._deadline:
                 logger.info(f'max_runtime ({max_runtime} seconds) exceeded. Terminating...')
                 self.terminate = True
             if i == len(self.train_loader) - 1 or self.terminate:
@@ -257,7 +256,7 @@ class TrainerMulti(Trainer):
                 images['fname'] = Path(fname[0]).stem
                 images['inp'] = inp.numpy()
                 images['target'] = multi_class_target.numpy()
-                images['out'] = dout.detach().cpu().numpy()
+                images['out'] = dout.detach().float().cpu().numpy()
                 self._put_current_attention_maps_into(images)
 
             if self.terminate:
@@ -280,8 +279,8 @@ class TrainerMulti(Trainer):
             # Everything with a "d" prefix refers to tensors on self.device (i.e. probably on GPU)
             inp, target = batch['inp'], batch['target']
             cube_meta = batch['cube_meta']
-            dinp = inp.to(self.device, non_blocking=True)
-            dtarget = target[:,:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop].to(self.device, non_blocking=True) if self.loss_crop else target.to(self.device, non_blocking=True)
+            dinp = self._normalize_input(inp.to(self.device, non_blocking=True))
+            dtarget = self._target_to_device(target[:,:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop] if self.loss_crop else target)
             weight = cube_meta[0].to(device=self.device, dtype=self.criterion.weight.dtype, non_blocking=True)
             prev_weight = self.criterion.weight.clone()
             self.criterion.weight *= weight
@@ -299,7 +298,7 @@ class TrainerMulti(Trainer):
             if self.loss_crop:
                 multi_class_target = multi_class_target[:,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop,self.loss_crop:-self.loss_crop]
             val_loss.append(self.criterion(dout, dtarget).item())
-            out = dout.detach().cpu()
+            out = dout.detach().float().cpu()
             out_class = out.argmax(dim=1)
             self.criterion.weight = prev_weight
             for name, evaluator in self.valid_metrics.items():
@@ -7,25 +7,30 @@ import datetime
 import pprint
 from collections import deque
 
+import contextlib
 import gc
 import logging
 import os
 import shutil
+import time
 import zipfile
 
 from itertools import islice
 from math import nan
 from pickle import PickleError
 from textwrap import dedent
-from typing import Tuple, Dict, Optional, Callable, Any, Sequence, List, Union
+from typing import Tuple, Dict, Optional, Callable, Any, Sequence, List, Union, Iterable, Iterator
 
 import inspect
 import IPython
+import numba
 import numpy as np
 import tensorboardX
 import torch
+import torch.distributed
 import torch.utils.data
 from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
 from torch.optim.lr_scheduler import StepLR
 from tqdm import tqdm
 
@@ -49,15 +54,71 @@ class NaNException(RuntimeError):
 
 
 def _worker_init_fn(worker_id: int) -> None:
-    """Sets a unique but deterministic random seed for background workers.
+    """Sets a unique but deterministic random seed for background workers
+    and splits numba's threads between them.
 
     Only sets the seed for NumPy because PyTorch and Python's own RNGs
     take care of reseeding on their own.
-    See https://github.com/numpy/numpy/issues/9650."""
+    See https://github.com/numpy/numpy/issues/9650.
+
+    The parallel numba kernels in :py:mod:`elektronn3.data.coord_transforms`
+    would otherwise use one thread per CPU core in every worker. PyTorch
+    already limits its own intra-op threads to 1 in workers. An explicitly
+    set ``NUMBA_NUM_THREADS`` environment variable is respected."""
     # Modulo 2**32 because np.random.seed() only accepts values up to 2**32 - 1
     initial_seed = torch.initial_seed() % 2**32
     worker_seed = initial_seed + worker_id
     np.random.seed(worker_seed)
+    if 'NUMBA_NUM_THREADS' not in os.environ:
+        num_workers = torch.utils.data.get_worker_info().num_workers
+        numba.set_num_threads(max(1, numba.config.NUMBA_NUM_THREADS // num_workers))
+
+
+def _prefetch_to_device(
+        loader: Iterable[Dict[str, Any]],
+        device: torch.device
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Iterate over batches of ``loader`` and yield ``(batch, dbatch)`` pairs,
+    where ``dbatch`` contains copies of the tensors of ``batch`` on ``device``.
+
+    On CUDA devices, the copy of the next batch is already issued on a
+    separate stream before the current batch is yielded, so the host-to-device
+    transfer of the next batch overlaps with computations on the current one
+    (this requires page-locked memory, i.e. ``pin_memory=True`` in the loader).
+    """
+    copy_stream = torch.cuda.Stream(device) if device.type == 'cuda' else None
+
+    def to_device(batch):
+        if copy_stream is None:
+            return {k: v.to(device) if torch.is_tensor(v) else v for k, v in batch.items()}, None
+        with torch.cuda.stream(copy_stream):
+            dbatch = {
+                k: v.to(device, non_blocking=True) if torch.is_tensor(v) else v
+                for k, v in batch.items()
+            }
+            copied = torch.cuda.Event()
+            copied.record(copy_stream)
+        return dbatch, copied
+
+    def ready(dbatch, copied):
+        if copied is not None:
+            # Work that is queued on the compute stream from now on waits for the copy
+            compute_stream = torch.cuda.current_stream(device)
+            compute_stream.wait_event(copied)
+            for v in dbatch.values():
+                if torch.is_tensor(v):
+                    # Don't let the allocator reuse the memory while the compute stream uses it
+                    v.record_stream(compute_stream)
+        return dbatch
+
+    pending = None
+    for batch in loader:
+        dbatch, copied = to_device(batch)
+        if pending is not None:
+            yield pending[0], ready(*pending[1:])
+        pending = (batch, dbatch, copied)
+    if pending is not None:
+        yield pending[0], ready(*pending[1:])
 
 
 # Be careful from where you call this! Not sure if this is concurrency-safe.
@@ -210,10 +271,51 @@ class Trainer:
             It is called once each ``preview_interval`` epochs.
             If ``None``, a tensorboard-based default handler is used that
             works for most classification scenarios.
-        mixed_precision: If ``True``, enable Automated Mixed Precision training
-            powered by https://github.com/NVIDIA/apex to reduce memory usage
+        mixed_precision: If ``True``, enable Automatic Mixed Precision
+            training (see :py:mod:`torch.amp`) to reduce memory usage
             and (if a GPU with Tensor Cores is used) make training much faster.
             This is currently experimental and might cause instabilities.
+        amp_dtype: Lower-precision floating point type that is used for
+            eligible operations if ``mixed_precision`` is enabled.
+            ``torch.float16`` training uses loss scaling to avoid gradient
+            underflow. ``torch.bfloat16`` has the same range as
+            ``torch.float32`` and doesn't need it, but is only fast on
+            recent GPUs (Ampere and newer).
+        input_mean: Optional per-channel mean value(s) of the inputs. If
+            ``input_mean`` and ``input_std`` are set, inputs are normalized
+            on ``device`` after they have been copied there, which is faster
+            than normalizing each sample in the data loader (e.g. with
+            :py:class:`elektronn3.data.transforms.Normalize`) and allows
+            data loaders to deliver inputs with integer dtypes.
+        input_std: Optional per-channel standard deviation value(s) of the
+            inputs. Only used together with ``input_mean``.
+        optimizer_iterations: Number of training steps (batches) over which
+            gradients are accumulated before the ``optimizer`` updates the
+            model weights. This increases the effective batch size to
+            ``batch_size * optimizer_iterations`` without requiring more
+            memory. Losses are divided by ``optimizer_iterations``, so
+            gradients are averaged over the accumulated batches.
+            Note that ``max_steps`` and schedulers still count batches, not
+            optimizer updates.
+        cuda_graph: If ``True``, the forward and backward passes of the
+            ``model`` are captured into CUDA graphs in the first training
+            step (see :py:func:`torch.cuda.make_graphed_callables`) and
+            replayed in all later steps, which removes most of the kernel
+            launch overhead. This requires a CUDA ``device``, a model with
+            static control flow and training samples that always have the
+            same shape (incomplete last batches are dropped). Loss
+            calculation, optimizer steps and validation are not affected.
+            Not supported in distributed training.
+
+    Distributed data parallel training is enabled automatically if the
+    ``Trainer`` is created after ``torch.distributed.init_process_group()``
+    has been called (e.g. in a script that is launched by ``torchrun``).
+    In this case, the ``model`` should be wrapped in
+    ``torch.nn.parallel.DistributedDataParallel`` and each process trains on
+    its own share of each epoch's training samples, so the effective batch
+    size is ``batch_size * world_size``. Only the process with rank 0
+    validates, writes files and logs to tensorboard.
+    See ``examples/train_unet_neurodata.py`` for how to launch it.
     """
 
     tb: tensorboardX.SummaryWriter
@@ -258,6 +360,11 @@ class Trainer:
             sample_plotting_handler: Optional[Callable] = None,
             preview_plotting_handler: Optional[Callable] = None,
             mixed_precision: bool = False,
+            amp_dtype: torch.dtype = torch.float16,
+            input_mean: Optional[Union[Sequence[float], float]] = None,
+            input_std: Optional[Union[Sequence[float], float]] = None,
+            optimizer_iterations: int = 1,
+            cuda_graph: bool = False,
     ):
         inference_kwargs = {} if inference_kwargs is None else inference_kwargs
         if preview_batch is not None and (
@@ -292,6 +399,19 @@ class Trainer:
         self.sample_plotting_handler = sample_plotting_handler
         self.preview_plotting_handler = preview_plotting_handler
         self.mixed_precision = mixed_precision
+        self.amp_dtype = amp_dtype
+        # Loss scaling is only needed for float16. If it is disabled, the scaler passes
+        #  losses through unchanged and step() just calls optimizer.step().
+        self.grad_scaler = torch.amp.GradScaler(
+            device.type, enabled=mixed_precision and amp_dtype == torch.float16
+        )
+        if (input_mean is None) != (input_std is None):
+            raise ValueError('input_mean and input_std have to be set together.')
+        self._dinput_mean = None
+        self._dinput_std = None
+        if input_mean is not None:
+            self._dinput_mean = torch.as_tensor(input_mean, dtype=torch.float32, device=device).reshape(-1)
+            self._dinput_std = torch.as_tensor(input_std, dtype=torch.float32, device=device).reshape(-1)
 
         self._tracker = HistoryTracker()
         self._timer = Timer()
@@ -315,23 +435,31 @@ class Trainer:
                     hparams[k] = str(v)
         self.hparams = hparams
 
-        if self.mixed_precision:
-            from apex import amp
-            self.model, self.optimizer = amp.initialize(self.model, self.optimizer, opt_level='O1')
+        self.distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
+        self.rank = torch.distributed.get_rank() if self.distributed else 0
+
+        if cuda_graph and (device.type != 'cuda' or self.distributed):
+            raise ValueError('cuda_graph requires a CUDA device and is not supported in distributed training.')
+        if optimizer_iterations < 1:
+            raise ValueError('optimizer_iterations has to be a positive integer.')
+        self.optimizer_iterations = optimizer_iterations
+        self.cuda_graph = cuda_graph
+        self._graphed_model = None  # Captured on the first training step
 
         if exp_name is None:  # Auto-generate a name based on model name and ISO timestamp
             timestamp = datetime.datetime.now().strftime('%y-%m-%d_%H-%M-%S')
-            exp_name = model.__class__.__name__ + '__' + timestamp
+            exp_name = self._local_model().__class__.__name__ + '__' + timestamp
         self.exp_name = exp_name
         self.save_path = os.path.join(save_root, exp_name)
-        if os.path.isdir(self.save_path):
-            raise RuntimeError(
-                f'{self.save_path} already exists.\nPlease choose a '
-                'different combination of save_root and exp_name.'
-            )
-        os.makedirs(self.save_path)
-        _change_log_file_to(f'{self.save_path}/elektronn3.log')
-        logger.info(f'Writing files to save_path {self.save_path}/\n')
+        if self.rank == 0:
+            if os.path.isdir(self.save_path):
+                raise RuntimeError(
+                    f'{self.save_path} already exists.\nPlease choose a '
+                    'different combination of save_root and exp_name.'
+                )
+            os.makedirs(self.save_path)
+            _change_log_file_to(f'{self.save_path}/elektronn3.log')
+            logger.info(f'Writing files to save_path {self.save_path}/\n')
 
         self.terminate = False
         self.step = 0
@@ -351,7 +479,7 @@ class Trainer:
                 enable_videos = False
         self.enable_videos = enable_videos
         self.tb = None  # Tensorboard handler
-        if enable_tensorboard:
+        if enable_tensorboard and self.rank == 0:
             if self.sample_plotting_handler is None:
                 self.sample_plotting_handler = handlers._tb_log_sample_images
             if self.preview_plotting_handler is None:
@@ -368,11 +496,17 @@ class Trainer:
             if self.hparams:
                 self.tb.add_hparams(hparam_dict=self.hparams, metric_dict={})
 
+        # In distributed training, each process gets a different subset of samples.
+        self.train_sampler = DistributedSampler(self.train_dataset) if self.distributed else None
+        # Keep background workers alive between epochs and let each of them
+        #  prepare several batches in advance.
+        worker_kwargs = {'persistent_workers': True, 'prefetch_factor': 4} if self.num_workers > 0 else {}
         self.train_loader = DataLoader(
-            self.train_dataset, batch_size=self.batch_size, shuffle=True,
-            num_workers=self.num_workers, pin_memory=True,
+            self.train_dataset, batch_size=self.batch_size,
+            shuffle=self.train_sampler is None, sampler=self.train_sampler,
+            num_workers=self.num_workers, pin_memory=True, drop_last=self.cuda_graph,
             timeout=60 if self.num_workers > 0 else 0,
-            worker_init_fn=_worker_init_fn
+            worker_init_fn=_worker_init_fn, **worker_kwargs
         )
         # num_workers is set to 0 for valid_loader because validation background processes sometimes
         # fail silently and stop responding, bringing down the whole training process.
@@ -396,6 +530,9 @@ class Trainer:
         visualizations are computed and logged to tensorboard."""
         self.start_time = datetime.datetime.now()
         self.end_time = self.start_time + datetime.timedelta(seconds=max_runtime)
+        # The runtime limit is checked after every step against a monotonic clock, which
+        #  is cheaper to read than the wall clock and can't jump (e.g. on DST changes).
+        self._deadline = time.monotonic() + max_runtime
         self._save_model(suffix='_initial', verbose=False)
         self._lr_nhood.clear()
         self._lr_nhood.append(self.optimizer.param_groups[0]['lr'])  # LR of the first training step
@@ -403,6 +540,9 @@ class Trainer:
             try:
                 stats, misc, tr_sample_images = self._train(max_steps, max_runtime)
                 self.epoch += 1
+                if self.rank != 0:
+                    # Validation, logging and saving is only done by the main process
+                    continue
 
                 if self.valid_dataset is None:
                     stats['val_loss'] = nan
@@ -454,25 +594,35 @@ class Trainer:
         inp = batch['inp']
         target = batch.get('target')
         # Everything with a "d" prefix refers to tensors on self.device (i.e. probably on GPU)
-        dinp = inp.to(self.device, non_blocking=True)
-        dtarget = target.to(self.device, non_blocking=True) if target is not None else None
-        # forward pass
-        dout = self.model(dinp)
-        if dtarget is None:  # Assume self-supervised unary loss function
-            dloss = self.ss_criterion(dout)
-        else:
-            dloss = self.criterion(dout, dtarget)
-        if torch.isnan(dloss):
-            logger.error('NaN loss detected! Aborting training.')
-            raise NaNException
-        # update step
-        self.optimizer.zero_grad()
-        if self.mixed_precision:
-            with self.amp_handle.scale_loss(dloss, self.optimizer) as scaled_loss:
-                scaled_loss.backward()
+        dinp = self._normalize_input(inp.to(self.device, non_blocking=True))
+        dtarget = self._target_to_device(target)
+        # Gradients are accumulated over optimizer_iterations steps before each update
+        accum_start = self.step % self.optimizer_iterations == 0
+        accum_end = (self.step + 1) % self.optimizer_iterations == 0
+        # Gradients only need to be synchronized between processes before updates
+        if self.distributed and not accum_end:
+            sync_context = self.model.no_sync()
         else:
-            dloss.backward()
-        self.optimizer.step()
+            sync_context = contextlib.nullcontext()
+        with sync_context:
+            # forward pass
+            with self._autocast():
+                model = self._get_graphed_model(dinp) if self.cuda_graph else self.model
+                dout = model(dinp)
+                if dtarget is None:  # Assume self-supervised unary loss function
+                    dloss = self.ss_criterion(dout)
+                else:
+                    dloss = self.criterion(dout, dtarget)
+            if torch.isnan(dloss):
+                logger.error('NaN loss detected! Aborting training.')
+                raise NaNException
+            # update step
+            if accum_start:
+                self.optimizer.zero_grad(set_to_none=True)
+            self.grad_scaler.scale(dloss / self.optimizer_iterations).backward()
+        if accum_end:
+            self.grad_scaler.step(self.optimizer)
+            self.grad_scaler.update()
         return dloss, dout
 
     def _train(self, max_steps, max_runtime):
@@ -486,16 +636,20 @@ class Trainer:
         # Hold image tensors for real-time training sample visualization in tensorboard
         images: Dict[str, np.ndarray] = {}
 
+        if self.train_sampler is not None:
+            self.train_sampler.set_epoch(self.epoch)  # Reshuffle sample assignment to processes
+
         running_vx_size = 0  # Counts input sizes (number of pixels/voxels) of training batches
         timer = Timer()
         batch_iter = tqdm(
-            self.train_loader, 'Training', total=len(self.train_loader), dynamic_ncols=True
+            self.train_loader, 'Training', total=len(self.train_loader), dynamic_ncols=True,
+            disable=self.rank != 0
         )
-        for i, batch in enumerate(batch_iter):
+        for i, (batch, dbatch) in enumerate(_prefetch_to_device(batch_iter, self.device)):
             if self.step in self.extra_save_steps:
                 self._save_model(f'_step{self.step}', verbose=True)
 
-            dloss, dout = self._train_step(batch)
+            dloss, dout = self._train_step(dbatch)
 
             with torch.no_grad():
                 loss = float(dloss)
@@ -519,7 +673,7 @@ class Trainer:
                 images['inp'] = batch['inp'].numpy()
                 if 'target' in batch:
                     images['target'] = batch['target'].numpy()
-                images['out'] = dout.detach().cpu().numpy()
+                images['out'] = dout.detach().float().cpu().numpy()
                 self._put_current_attention_maps_into(images)
 
             if self.terminate:
@@ -532,9 +686,10 @@ class Trainer:
         return stats, misc, images
 
     def _put_current_attention_maps_into(self, images):
-        if getattr(self.model, 'attention', None):
-            for i in range(len(self.model.up_convs)):
-                att = self.model.up_convs[i].att[0][0].detach().cpu().numpy()
+        model = self._local_model()
+        if getattr(model, 'attention', None):
+            for i in range(len(model.up_convs)):
+                att = model.up_convs[i].att[0][0].detach().cpu().numpy()
                 if att.ndim == 3:
                     att = att[att.shape[0] // 2]
                 images[f'att{i}'] = att
@@ -545,9 +700,67 @@ class Trainer:
         if self.step >= max_steps:
             logger.info(f'max_steps ({max_steps}) exceeded. Terminating...')
             self.terminate = True
-        if datetime.datetime.now() >= self.end_time:
+        if time.monotonic() >= self._deadline:
             logger.info(f'max_runtime ({max_runtime} seconds) exceeded. Terminating...')
             self.terminate = True
+        if self.distributed:
+            # Make sure all processes stop at the same step, even if their
+            #  clocks disagree about max_runtime.
+            terminate = torch.tensor(int(self.terminate), device=self.device)
+            torch.distributed.all_reduce(terminate, op=torch.distributed.ReduceOp.MAX)
+            self.terminate = bool(terminate)
+
+    def _autocast(self) -> torch.autocast:
+        """Context manager for forward passes, enables autocasting if mixed_precision is set"""
+        # Graph capture doesn't support autocast's weight cast cache
+        return torch.autocast(
+            self.device.type, dtype=self.amp_dtype, enabled=self.mixed_precision,
+            cache_enabled=not self.cuda_graph
+        )
+
+    def _get_graphed_model(self, dinp: torch.Tensor) -> torch.nn.Module:
+        """Get a version of self.model whose forward and backward passes are replayed
+        from CUDA graphs. The graphs are captured on the first call, using ``dinp`` as
+        the example input for all later calls."""
+        if self._graphed_model is None:
+            # make_graphed_callables() replaces the forward method of the module that it
+            #  captures, so a wrapper is captured to keep self.model itself unchanged
+            #  (and serializable). The wrapper shares all parameters with self.model.
+            self._graphed_model = torch.cuda.make_graphed_callables(
+                torch.nn.Sequential(self.model), (dinp,)
+            )
+        return self._graphed_model
+
+    def _normalize_input(self, dinp: torch.Tensor) -> torch.Tensor:
+        """Normalize an input batch on self.device if input_mean and input_std are set"""
+        if self._dinput_mean is None:
+            return dinp
+        # Broadcast per-channel values over the batch and spatial dimensions (N, C, [D,] H, W)
+        bshape = (1, -1) + (1,) * (dinp.dim() - 2)
+        # The subtraction is not in-place, so integer inputs are cast to float32 in the same
+        #  elementwise op and the (possibly shared) original tensor is left untouched.
+        return dinp.sub(self._dinput_mean.view(bshape)).div_(self._dinput_std.view(bshape))
+
+    def _target_to_device(self, target: Optional[torch.Tensor]) -> Optional[torch.Tensor]:
+        """Move a target batch to self.device. Integer targets can be delivered in smaller
+        types to save transfer bandwidth. They are converted to the int64 class indices that
+        PyTorch losses expect after the copy."""
+        if target is None:
+            return None
+        dtarget = target.to(self.device, non_blocking=True)
+        if not dtarget.is_floating_point() and dtarget.dtype != torch.bool:
+            dtarget = dtarget.long()
+        return dtarget
+
+    def _local_model(self) -> torch.nn.Module:
+        """Get the model without its ``DistributedDataParallel`` wrapper (if any).
+
+        Forward passes that only run in one process (validation, previews) must
+        use this instead of ``self.model``, because the wrapper communicates
+        with the other processes in its forward pass."""
+        if isinstance(self.model, torch.nn.parallel.DistributedDataParallel):
+            return self.model.module
+        return self.model
 
     def _scheduler_step(self, loss):
         """Update schedules"""
@@ -555,6 +768,12 @@ class Trainer:
             # support ReduceLROnPlateau; doc. uses validation loss instead
             # http://pytorch.org/docs/master/optim.html#torch.optim.lr_scheduler.ReduceLROnPlateau
             if 'metrics' in inspect.signature(sched.step).parameters:
+                if self.distributed:
+                    # Step on the loss averaged over all processes, so their
+                    #  learning rates can't drift apart.
+                    dloss = torch.tensor(loss, dtype=torch.float64, device=self.device)
+                    torch.distributed.all_reduce(dloss, op=torch.distributed.ReduceOp.SUM)
+                    loss = float(dloss) / torch.distributed.get_world_size()
                 sched.step(metrics=loss)
             else:
                 sched.step()
@@ -608,16 +827,30 @@ class Trainer:
                 self.optimizer.swap_swa_sgd()  # Perform SWA and write results into model params
                 max_bn_corr_batches = 10  # Batches to use to correct SWA batchnorm stats
                 # We're assuming here that len(self.train_loader), which is an upper bound for
-                #  len(swa_loader), is sufficient for a good stat estimation
-                swa_loader = islice(self.train_loader, max_bn_corr_batches)
+                #  len(swa_loader), is sufficient for a good stat estimation.
+                # A separate loader is needed because the persistent workers of
+                #  self.train_loader are busy with the current training epoch.
+                swa_loader = islice(
+                    DataLoader(self.train_dataset, batch_size=self.batch_size),
+                    max_bn_corr_batches
+                )
+                # The model has to see the same (normalized) inputs as during training
+                swa_inputs = (
+                    self._normalize_input(batch['inp'].to(self.device, non_blocking=True))
+                    for batch in swa_loader
+                )
                 # This may be expensive (comparable to validation computations)
-                SWA.bn_update(swa_loader, self.model, device=self.device)
+                SWA.bn_update(swa_inputs, self.model)
                 self._save_model(suffix='_swa', verbose=False)
                 self.optimizer.swap_swa_sgd()  # Swap back model to the original state before SWA
 
-    @torch.no_grad()
+    # inference_mode() is cheaper than no_grad() because it also skips the version counter and
+    #  view tracking of the tensors that are created. This is fine here because the outputs
+    #  are only used for metrics and plots, never in autograd.
+    @torch.inference_mode()
     def _validate(self) -> Tuple[Dict[str, float], Dict[str, np.ndarray]]:
-        self.model.eval()  # Set dropout and batchnorm to eval mode
+        model = self._local_model()
+        model.eval()  # Set dropout and batchnorm to eval mode
 
         val_loss = []
         stats = {name: [] for name in self.valid_metrics.keys()}
@@ -629,14 +862,15 @@ class Trainer:
             # Everything with a "d" prefix refers to tensors on self.device (i.e. probably on GPU)
             inp = batch['inp']
             target = batch.get('target')
-            dinp = inp.to(self.device, non_blocking=True)
-            dtarget = target.to(self.device, non_blocking=True) if target is not None else None
-            dout = self.model(dinp)
-            if dtarget is None:  # Use self-supervised unary loss function
-                val_loss.append(self.ss_criterion(dout).item())
-            else:
-                val_loss.append(self.criterion(dout, dtarget).item())
-            out = dout.detach().cpu()
+            dinp = self._normalize_input(inp.to(self.device, non_blocking=True))
+            dtarget = self._target_to_device(target)
+            with self._autocast():
+                dout = model(dinp)
+                if dtarget is None:  # Use self-supervised unary loss function
+                    val_loss.append(self.ss_criterion(dout).item())
+                else:
+                    val_loss.append(self.criterion(dout, dtarget).item())
+            out = dout.detach().float().cpu()
             for name, evaluator in self.valid_metrics.items():
                 stats[name].append(evaluator(target, out))
 
@@ -652,7 +886,7 @@ class Trainer:
         for name in self.valid_metrics.keys():
             stats[name] = np.nanmean(stats[name])
 
-        self.model.train()  # Reset model to training mode
+        model.train()  # Reset model to training mode
 
         return stats, images
 
@@ -702,6 +936,8 @@ class Trainer:
             val_loss: Stores the validation loss
                 (default value if not supplied: NaN)
         """
+        if self.rank != 0:
+            return  # Only the main process writes files
         log = logger.info if verbose else logger.debug
 
         model = self.model
@@ -870,7 +1106,7 @@ class Trainer:
             raise RuntimeError('Can\'t do preview prediction if Trainer.out_channels is not set.')
         out_shape = (self.out_channels, *inp.shape[2:])
         predictor = Predictor(
-            model=self.model,
+            model=self._local_model(),
             device=self.device,
             out_shape=out_shape,
             **inference_kwargs,
@@ -121,13 +121,15 @@ valid_dataset = SimpleNeuroData2d(train=False, transform=valid_transform,
                                   out_channels=out_channels)
 
 # Set up optimization
-optimizer = optim.Adam(
+optimizer = optim.AdamW(
     model.parameters(),
     weight_decay=0.5e-4,
     lr=lr,
-    amsgrad=True
+    amsgrad=True,
+    fused=device.type == 'cuda',  # Update all parameters in one kernel (requires PyTorch >= 2.0)
 )
-lr_sched = optim.lr_scheduler.StepLR(optimizer, lr_stepsize, lr_dec)
+# Same schedule as StepLR(optimizer, lr_stepsize, lr_dec), but computed in closed form from the step count
+lr_sched = optim.lr_scheduler.LambdaLR(optimizer, lambda step: lr_dec ** (step // lr_stepsize))
 
 valid_metrics = {
     'val_accuracy': metrics.bin_accuracy,
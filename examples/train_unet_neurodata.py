@@ -6,6 +6,10 @@
 # Max Planck Institute of Neurobiology, Munich, Germany
 # Authors: Martin Drawitsch, Philipp Schubert
 
+# For multi-GPU training, launch this script with one process per GPU via
+#  $ torchrun --nproc_per_node=NGPU train_unet_neurodata.py ...
+# Each process then trains the model with DistributedDataParallel.
+
 import argparse
 import logging
 import os
@@ -46,30 +50,84 @@ parser.add_argument(
 "onsave": Use regular Python model for training, but trace it on-demand for saving training state;
 "train": Use traced model for training and serialize it on disk"""
 )
+parser.add_argument(
+    '-w', '--num-workers', type=int, default=2,
+    help='Number of background processes that produce training samples.'
+)
 parser.add_argument('--seed', type=int, default=0, help='Base seed for all RNGs.')
 parser.add_argument(
     '--deterministic', action='store_true',
     help='Run in fully deterministic mode (at the cost of execution speed).'
 )
+parser.add_argument(
+    '--compile', action='store_true',
+    help='Compile the model with torch.compile() for faster training.'
+)
+parser.add_argument(
+    '--accum-steps', type=int, default=1,
+    help='Number of batches over which gradients are accumulated before each optimizer step.'
+)
+parser.add_argument(
+    '--cuda-graph', action='store_true',
+    help='Replay the forward and backward passes of the model from CUDA graphs.'
+)
+parser.add_argument(
+    '--amp', choices=['fp16', 'bf16'], default=None,
+    help='Enable mixed precision training with the given reduced-precision float type.'
+)
 parser.add_argument('-i', '--ipython', action='store_true',
     help='Drop into IPython shell on errors or keyboard interrupts.'
 )
 args = parser.parse_args()
+if args.compile and args.jit == 'train':
+    parser.error('--compile can\'t be combined with --jit train.')
+if args.compile and args.cuda_graph:
+    parser.error('--compile and --cuda-graph are mutually exclusive.')
+
+# torchrun sets LOCAL_RANK etc. for each process it launches.
+distributed = 'LOCAL_RANK' in os.environ
+use_cuda = not args.disable_cuda and torch.cuda.is_available()
+if distributed:
+    local_rank = int(os.environ['LOCAL_RANK'])
+    if use_cuda:
+        torch.cuda.set_device(local_rank)
+    torch.distributed.init_process_group(backend='nccl' if use_cuda else 'gloo', init_method='env://')
+    rank = torch.distributed.get_rank()
+else:
+    rank = 0
+
+# Split the CPU cores between the training processes on this node and their data loader
+#  workers to avoid oversubscription. The environment variables have to be set before
+#  numba (used for data augmentation) is imported and are inherited by the workers.
+num_threads = max(1, os.cpu_count() // ((args.num_workers + 1) * int(os.environ.get('LOCAL_WORLD_SIZE', 1))))
+for var in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMBA_NUM_THREADS']:
+    os.environ[var] = str(num_threads)
+torch.set_num_threads(num_threads)
+torch.set_num_interop_threads(1)
 
 # Set up all RNG seeds, set level of determinism
 random_seed = args.seed
-torch.manual_seed(random_seed)
-np.random.seed(random_seed)
-random.seed(random_seed)
+torch.manual_seed(random_seed)  # Same in all processes, so models are initialized identically
+# Data augmentation RNGs are seeded differently in each process
+np.random.seed(random_seed + rank)
+random.seed(random_seed + rank)
 deterministic = args.deterministic
 if deterministic:
     torch.backends.cudnn.deterministic = True
 else:
     torch.backends.cudnn.benchmark = True  # Improves overall performance in *most* cases
+    # Allow TensorFloat-32 Tensor Core math for convolutions and matmuls on Ampere and newer GPUs
+    torch.backends.cudnn.allow_tf32 = True
+    torch.set_float32_matmul_precision('high')
 
 # Don't move this stuff, it needs to be run this early to work
 import elektronn3
-elektronn3.select_mpl_backend('Agg')
+if rank == 0:
+    elektronn3.select_mpl_backend('Agg')
+else:
+    # Only rank 0 plots. The other processes just need to avoid loading an interactive
+    #  backend when elektronn3.training imports matplotlib.
+    os.environ['MPLBACKEND'] = 'Agg'
 logger = logging.getLogger('elektronn3log')
 
 from elektronn3.data import PatchCreator, transforms, utils, get_preview_batch
@@ -79,8 +137,8 @@ from elektronn3.modules import DiceLoss, CombinedLoss
 from elektronn3.models.unet import UNet
 
 
-if not args.disable_cuda and torch.cuda.is_available():
-    device = torch.device('cuda')
+if use_cuda:
+    device = torch.device('cuda', local_rank) if distributed else torch.device('cuda')
 else:
     device = torch.device('cpu')
 logger.info(f'Running on device: {device}')
@@ -101,6 +159,10 @@ model = UNet(
     # full_norm=False,  # Uncomment to restore old sparse normalization scheme
     # up_mode='resizeconv_nearest',  # Enable to avoid checkerboard artifacts
 ).to(device)
+if use_cuda:
+    # Channels-last weights make cuDNN choose its faster NDHWC convolution kernels
+    #  (inputs are converted to the same layout by the first convolution).
+    model = model.to(memory_format=torch.channels_last_3d)
 # Example for a model-compatible input.
 example_input = torch.ones(1, 1, 32, 64, 64)
 
@@ -134,6 +196,8 @@ if os.getenv('CLUSTER') == 'WHOLEBRAIN':  # Use bigger, but private data set
     dataset_std = (0.15687169,)
     # Class weights for imbalanced dataset
     class_weights = torch.tensor([0.2808, 0.7192]).to(device)
+    # Inputs are floats in [0, 1], so keep the default sample dtypes.
+    dataset_dtype_kwargs = {}
 else:  # Use publicly available neuro_data_cdhw dataset
     data_root = os.path.expanduser('~/neuro_data_cdhw/')
     input_h5data = [
@@ -149,6 +213,9 @@ else:  # Use publicly available neuro_data_cdhw dataset
     dataset_mean = (155.291411,)
     dataset_std = (42.599973,)
     class_weights = torch.tensor([0.2653, 0.7347]).to(device)
+    # The raw data are 8-bit images and the targets have only two classes, so samples can
+    #  be delivered in small integer types. Inputs are normalized on the GPU by the Trainer.
+    dataset_dtype_kwargs = {'inp_dtype': np.uint8, 'target_dtype': np.int8}
 
 # TODO: Recalculate above class_weights with mode='inverse'
 
@@ -179,12 +246,34 @@ if args.resume is not None:  # Load pretrained network
         else:
             raise ValueError(f'Can\'t load {pretrained}.')
 
+if args.compile:
+    # Compiles in place, so state dicts and the model type stay the same. Since all
+    #  training patches have the same shape, compilation only happens once.
+    model.compile(mode='max-autotune')
+    # Compiled models can't be jit-traced
+    enable_save_trace = False
+
+if distributed:
+    # Gradients are all-reduced across processes, overlapping with the backward pass.
+    model = nn.parallel.DistributedDataParallel(
+        model.to(device),
+        device_ids=[local_rank] if use_cuda else None,
+        output_device=local_rank if use_cuda else None,
+        gradient_as_bucket_view=True,
+    )
+    # Model init is done, so from now on seed torch (which seeds data loader
+    #  workers) differently in each process, too.
+    torch.manual_seed(random_seed + rank)
+
 # Transformations to be applied to samples before feeding them to the network
 common_transforms = [
     transforms.SqueezeTarget(dim=0),  # Workaround for neuro_data_cdhw
-    transforms.Normalize(mean=dataset_mean, std=dataset_std, inplace=True)
+    # Inputs are normalized by the Trainer on the GPU (see input_mean/input_std below)
 ]
 train_transform = transforms.Compose(common_transforms + [
+    # Note: These augmentations see unnormalized inputs, so their parameters have to be scaled
+    #  to the raw value range (e.g. 0..255 instead of 0..1 for neuro_data_cdhw). Their results
+    #  are rounded and clipped to 0..255 when the samples are delivered as uint8.
     # transforms.RandomRotate2d(prob=0.9),
     # transforms.RandomGrayAugment(channels=[0], prob=0.3),
     # transforms.RandomGammaCorrection(gamma_std=0.25, gamma_min=0.25, prob=0.3),
@@ -198,7 +287,10 @@ common_data_kwargs = {  # Common options for training and valid sets.
     'aniso_factor': aniso_factor,
     'patch_shape': (44, 88, 88),
     # 'offset': (8, 20, 20),
-    # 'in_memory': True  # Uncomment to avoid disk I/O (if you have enough host memory for the data)
+    # Load all data into host memory (in its native dtype) once, so training
+    #  patches are sliced from RAM. Disable this if the data doesn't fit into memory.
+    'in_memory': True,
+    **dataset_dtype_kwargs,
 }
 train_dataset = PatchCreator(
     input_sources=[input_h5data[i] for i in range(len(input_h5data)) if i not in valid_indices],
@@ -298,7 +390,7 @@ trainer = Trainer(
     train_dataset=train_dataset,
     valid_dataset=valid_dataset,
     batch_size=1,
-    num_workers=2,
+    num_workers=args.num_workers,
     save_root=save_root,
     exp_name=args.exp_name,
     example_input=example_input,
@@ -313,14 +405,20 @@ trainer = Trainer(
     out_channels=out_channels,
     ipython_shell=args.ipython,
     # extra_save_steps=range(0, max_steps, 10_000),
-    # mixed_precision=True,  # Enable to use Apex for mixed precision training
+    mixed_precision=args.amp is not None,
+    amp_dtype=torch.bfloat16 if args.amp == 'bf16' else torch.float16,
+    input_mean=dataset_mean,
+    input_std=dataset_std,
+    optimizer_iterations=args.accum_steps,
+    cuda_graph=args.cuda_graph,
 )
 
 if args.deterministic:
     assert trainer.num_workers <= 1, 'num_workers > 1 introduces indeterministic behavior'
 
 # Archiving training script, src folder, env info
-Backup(script_path=__file__,save_path=trainer.save_path).archive_backup()
+if rank == 0:
+    Backup(script_path=__file__,save_path=trainer.save_path).archive_backup()
 
 # Start training
 trainer.run(max_steps=max_steps, max_runtime=max_runtime)
@@ -330,3 +428,8 @@ trainer.run(max_steps=max_steps, max_runtime=max_runtime)
 #  dataset_mean = utils.calculate_means(train_dataset.inputs)
 #  dataset_std = utils.calculate_stds(train_dataset.inputs)
 #  class_weights = torch.tensor(utils.calculate_class_weights(train_dataset.targets))
+
+# How to re-chunk the HDF5 files for faster patch reads (run once, then point
+#  input_h5data and target_h5data to the new files):
+#  for fname, key in input_h5data + target_h5data:
+#      utils.rechunk_h5(fname, fname.replace('.h5', '_rechunked.h5'), keys=[key], chunks=(32, 64, 64))
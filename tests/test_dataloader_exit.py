@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+# Runs in a separate interpreter, because the failure mode is a process that never exits.
+_SCRIPT = textwrap.dedent("""
+    import numpy as np
+    import torch
+    from elektronn3.data import coord_transforms
+
+
+    class WarpDataset(torch.utils.data.Dataset):
+        def __init__(self):
+            self.src = np.random.rand(1, 32, 48, 48).astype(np.float32)
+
+        def __len__(self):
+            return 4
+
+        def __getitem__(self, index):
+            while True:
+                M = coord_transforms.get_warped_coord_transform(
+                    self.src.shape[-3:], (8, 16, 16), aniso_factor=1, warp_amount=0.5
+                )
+                try:
+                    inp, _ = coord_transforms.warp_slice(self.src, (8, 16, 16), M)
+                except coord_transforms.WarpingOOBError:
+                    continue
+                return torch.as_tensor(inp)
+
+
+    dataset = WarpDataset()
+    dataset[0]  # Start the numba thread pool before the workers are forked
+    for batch in torch.utils.data.DataLoader(dataset, batch_size=1, num_workers=2):
+        assert batch.shape == (1, 1, 8, 16, 16)
+""")
+
+
+def test_warping_in_dataloader_workers_exits():
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, '-c', _SCRIPT], cwd=repo_root, timeout=300)
+    assert proc.returncode == 0
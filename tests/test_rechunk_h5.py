@@ -0,0 +1,25 @@
+import h5py
+import numpy as np
+
+from elektronn3.data.utils import rechunk_h5
+
+
+def test_rechunk_h5_keeps_small_datasets_and_attrs(tmp_path):
+    src_path = str(tmp_path / 'src.h5')
+    dest_path = str(tmp_path / 'dest.h5')
+    raw = np.random.randint(0, 256, (2, 20, 30, 40), dtype=np.uint8)
+    offset = np.array([1, 2, 3])
+    with h5py.File(src_path, 'w') as f:
+        f.create_dataset('raw', data=raw)
+        f['raw'].attrs['resolution'] = [20., 10., 10.]
+        f.create_dataset('offset', data=offset)
+        f.attrs['name'] = 'test'
+
+    rechunk_h5(src_path, dest_path, chunks=(8, 16, 16))
+
+    with h5py.File(dest_path, 'r') as f:
+        assert f['raw'].chunks == (2, 8, 16, 16)
+        np.testing.assert_array_equal(f['raw'][()], raw)
+        np.testing.assert_array_equal(f['raw'].attrs['resolution'], [20., 10., 10.])
+        np.testing.assert_array_equal(f['offset'][()], offset)
+        assert f.attrs['name'] == 'test'
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import torch
+from torch import nn
+
+import elektronn3
+elektronn3.select_mpl_backend('Agg')
+from elektronn3.training import SWA, Trainer
+
+
+class UInt8Dataset(torch.utils.data.Dataset):
+    """Random uint8 images in [100, 200] with binary targets"""
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        inp = torch.randint(100, 201, (1, 16, 16), dtype=torch.uint8)
+        return {'inp': inp, 'target': (inp[0] > 150).to(torch.int8)}
+
+
+def test_swa_bn_update_uses_normalized_inputs(tmp_path):
+    torch.manual_seed(0)
+    # The leading BatchNorm layer records the statistics of the raw model inputs
+    model = nn.Sequential(nn.BatchNorm2d(1), nn.Conv2d(1, 2, 3, padding=1))
+    optimizer = SWA(torch.optim.SGD(model.parameters(), lr=0, momentum=0.9))
+    # The learning rate minimum at step 4 triggers an SWA BN update
+    lr_sched = torch.optim.lr_scheduler.CyclicLR(
+        optimizer, base_lr=1e-4, max_lr=1e-3, step_size_up=2, step_size_down=2
+    )
+    trainer = Trainer(
+        model=model,
+        criterion=nn.CrossEntropyLoss(),
+        optimizer=optimizer,
+        device=torch.device('cpu'),
+        save_root=str(tmp_path),
+        exp_name='swa',
+        train_dataset=UInt8Dataset(),
+        valid_dataset=UInt8Dataset(),
+        batch_size=2,
+        num_workers=0,
+        schedulers={'lr': lr_sched},
+        input_mean=(150.,),
+        input_std=(30.,),
+        enable_tensorboard=False,
+    )
+    trainer.run(max_steps=6)
+
+    state_dict_path = os.path.join(trainer.save_path, 'state_dict_swa.pth')
+    assert os.path.isfile(state_dict_path)
+    bn_mean = torch.load(state_dict_path, weights_only=False)['model_state_dict']['0.running_mean']
+    # Raw inputs have a mean of about 150, normalized inputs a mean of about 0
+    assert np.abs(bn_mean.numpy()).max() < 0.5
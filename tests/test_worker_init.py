@@ -0,0 +1,25 @@
+import os
+
+import numba
+import torch
+
+from elektronn3.training.trainer import _worker_init_fn
+
+
+class NumbaThreadsDataset(torch.utils.data.Dataset):
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return numba.get_num_threads()
+
+
+def test_worker_init_fn_splits_numba_threads():
+    if 'NUMBA_NUM_THREADS' in os.environ:
+        expected = numba.config.NUMBA_NUM_THREADS
+    else:
+        expected = max(1, numba.config.NUMBA_NUM_THREADS // 2)
+    loader = torch.utils.data.DataLoader(
+        NumbaThreadsDataset(), batch_size=1, num_workers=2, worker_init_fn=_worker_init_fn
+    )
+    assert [int(n) for n in loader] == [expected] * 4